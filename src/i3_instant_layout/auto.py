@@ -0,0 +1,160 @@
+"""The 'auto' layout: pick the layout that suits these windows best.
+
+Every registered layout is placed into the workspace's rect (see geometry.py)
+and scored by
+    - how far windows fall short of their minimum size
+      (WM_NORMAL_HINTS, but at least default_min_size)
+    - how many windows are hidden behind others (tabbed/stacked)
+    - the smallest window's area (shared between tabbed/stacked windows),
+      times how square it is - a 1920x40 window is no use either
+    - the total of the above, to break ties (e.g. empty matrix cells)
+
+The minimum sizes are read with python-xlib (the 'xlib' extra) - without
+it, or without X, every window gets default_min_size.
+
+The rectangles only depend on (width, height, window count), so they're
+cached, in memory and on disk next to the compiled layouts.
+Ties go to the layout registered first.
+"""
+import json
+import os
+import tempfile
+from collections import Counter
+
+
+default_min_size = (400, 240)
+
+_rectangles = {}
+_display = None  # False: there is no X
+
+
+def candidates():
+    from . import layouts
+
+    return [cls for cls in layouts.registry if cls is not layouts.Layout_Auto]
+
+
+def disk_path(width, height, window_count):
+    from . import cache
+
+    return cache.stamp_dir() / f"auto-{width}x{height}-{window_count}.json"
+
+
+def all_rectangles(width, height, window_count):
+    """{layout name: window rectangles} for every layout that can do
+    window_count windows"""
+    key = (width, height, window_count)
+    if key in _rectangles:
+        return _rectangles[key]
+    path = disk_path(width, height, window_count)
+    try:
+        with open(path, "r") as op:
+            result = {
+                name: [tuple(r) for r in rects]
+                for name, rects in json.load(op).items()
+            }
+    except (OSError, ValueError):
+        from . import geometry
+
+        result = {}
+        for cls in candidates():
+            try:
+                rects = geometry.window_rectangles(cls(), window_count, width, height)
+            except Exception:  # layouts don't support every window count
+                continue
+            if rects is not None and None not in rects:
+                result[cls.name] = rects
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=path.parent, suffix=".tmp", delete=False
+            ) as op:
+                json.dump(result, op)
+            os.replace(op.name, path)
+        except OSError:  # a cache is no reason to fail
+            pass
+    _rectangles[key] = result
+    return result
+
+
+def get_display():
+    """One X connection per process (the daemon picks many times),
+    None if there is no X (e.g. sway)"""
+    global _display
+    if _display is None:
+        try:
+            from Xlib import display
+
+            _display = display.Display()
+        except Exception:
+            _display = False
+    return _display or None
+
+
+def min_sizes(window_ids):
+    """(min width, min height) per window, from WM_NORMAL_HINTS,
+    at least default_min_size"""
+    global _display
+    result = [default_min_size] * len(window_ids)
+    d = get_display()
+    if d is None:  # defaults it is
+        return result
+    from Xlib import Xutil
+    from Xlib.error import ConnectionClosedError
+
+    for ii, window_id in enumerate(window_ids):
+        try:
+            hints = d.create_resource_object("window", window_id).get_wm_normal_hints()
+        except ConnectionClosedError:  # X went away - reconnect next time
+            _display = None
+            break
+        except Exception:  # window went away
+            continue
+        if hints is not None and hints.flags & Xutil.PMinSize:
+            result[ii] = (
+                max(hints.min_width, default_min_size[0]),
+                max(hints.min_height, default_min_size[1]),
+            )
+    return result
+
+
+def score(rects, mins):
+    """Higher is better"""
+    sharing = Counter(rects)
+    hidden = len(rects) - len(sharing)
+    shortfall = 0.0
+    smallest = None
+    total = 0.0
+    for rect, (min_width, min_height) in zip(rects, mins):
+        x, y, width, height = rect
+        shortfall += max(0, min_width - width) / min_width
+        shortfall += max(0, min_height - height) / min_height
+        useful = 0.0
+        if width > 0 and height > 0:
+            useful = (
+                width * height / sharing[rect] * min(width, height) / max(width, height)
+            )
+        total += useful
+        if smallest is None or useful < smallest:
+            smallest = useful
+    return (-shortfall, -hidden, smallest or 0.0, total)
+
+
+def best(width, height, mins):
+    """Name of the best layout for len(mins) windows"""
+    scored = all_rectangles(width, height, len(mins))
+    if not scored:
+        return None
+    return max(scored, key=lambda name: score(scored[name], mins))
+
+
+def pick(workspace, windows):
+    """The layout class to use for these windows (X ids, in window order)
+    on this workspace"""
+    from . import layouts
+
+    rect = workspace.rect
+    name = best(rect.width, rect.height, min_sizes(windows))
+    if name is None:
+        raise ValueError(f"No layout can do {len(windows)} windows")
+    return layouts.registry.get(name)
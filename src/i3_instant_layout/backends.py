@@ -0,0 +1,248 @@
+"""How a layout gets onto the screen.
+
+swallow: append_layout, then unmap & map every window with xdotool so i3
+    swallows them into the placeholders. The original way - i3 on X11 only.
+swap: append_layout with marked placeholders, and the windows swapped into
+    them - one i3 command, no forks. Needs append_layout, so i3 only.
+ipc: no layout file - the tree is built with split / move / layout / resize
+    commands. Windows are addressed by con_id, so no X11 tools are needed
+    and this works on sway as well.
+    Placeholders the windows don't fill (e.g. in a matrix) are left out.
+
+A backend decides how windows are identified (X11 id or con_id) and
+applies a compiled layout, the windows already in layout order.
+"""
+import json
+import os
+from . import timings
+
+
+class Backend:
+    name = None
+    ids = "window"  # the Con attribute identifying a window (see diff.py)
+    marked = False  # needs placeholders with marks (see main.mark_swallow_nodes)
+
+    def window_ids(self, workspace):
+        from . import main
+
+        return main.get_window_ids(workspace)
+
+    def active_window(self, workspace):
+        from . import main
+
+        return main.get_active_window(workspace)
+
+    def criteria(self, window):
+        return f'[id="{window}"]'
+
+    def x11_ids(self, workspace, windows):
+        """The X11 ids for windows (None for wayland windows)"""
+        return windows
+
+    def apply(self, layout_json, windows, marks, active, visit=(), leave=()):
+        """Turn the (nuked) workspace into the layout.
+
+        visit / leave are i3 commands to send before / after ours
+        (in the same message) for workspaces that are not visible.
+        """
+        raise NotImplementedError()
+
+
+class Swallow(Backend):
+    name = "swallow"
+
+    def apply(self, layout_json, windows, marks, active, visit=(), leave=()):
+        from . import main
+
+        if visit or leave:
+            raise ValueError("xdotool can't get hidden windows swallowed")
+        with timings.stage("append_layout"):
+            main.append_layout(layout_json, len(windows))
+        # we unmap and map all at once for speed.
+        unmap_cmd = ["xdotool"]
+        map_cmd = ["xdotool"]
+        for window_id in windows:
+            unmap_cmd.append("windowunmap")
+            map_cmd.append("windowmap")
+            unmap_cmd.append(str(window_id))
+            map_cmd.append(str(window_id))
+
+        # force i3 to swallow these windows.
+        with timings.stage("unmap/map"):
+            try:
+                main.run(unmap_cmd)
+                main.run(map_cmd)
+            except Exception:
+                # a window closed since the tree was read, xdotool stopped
+                # there - get the others back before giving up
+                for window_id in windows:
+                    try:
+                        main.run(["xdotool", "windowmap", str(window_id)])
+                    except Exception:
+                        pass
+                raise
+        if active is not None:
+            with timings.stage("focus"):
+                main.focus_window(active)
+
+
+class Swap(Backend):
+    name = "swap"
+    marked = True
+
+    def apply(self, layout_json, windows, marks, active, visit=(), leave=()):
+        from . import main
+
+        with timings.stage("append_layout+swap"):
+            main.append_layout(
+                layout_json,
+                len(windows),
+                then=main.swap_into_placeholders(windows, marks, active) + list(leave),
+                before=visit,
+            )
+
+
+class Ipc(Backend):
+    name = "ipc"
+    ids = "id"
+
+    def window_ids(self, workspace):
+        from . import main
+
+        return [
+            con.id
+            for con in main.walk_tree(workspace)
+            if not con.nodes
+            and (con.window or con.ipc_data.get("app_id"))
+            and not con.ipc_data.get("swallows")
+        ]
+
+    def active_window(self, workspace):
+        from . import main
+
+        con = main.get_active_con(workspace)
+        if con is None or not (con.window or con.ipc_data.get("app_id")):
+            return None
+        return con.id
+
+    def criteria(self, window):
+        return f"[con_id={window}]"
+
+    def x11_ids(self, workspace, windows):
+        return [workspace.find_by_id(x).window for x in windows]
+
+    def apply(self, layout_json, windows, marks, active, visit=(), leave=()):
+        from . import diff, main
+
+        with timings.stage("build"):
+            tree = diff.from_layout(json.loads(layout_json), windows, drop_empty=True)
+            commands = list(visit)
+            commands.extend(f"[con_id={x}] floating disable" for x in windows)
+            commands.extend(
+                f"[con_id={x}] mark --add {window_mark(x)}" for x in windows
+            )
+            wrappers = {}
+            build(tree, commands, wrappers)
+            resize(tree, commands, wrappers)
+            commands.extend(f"unmark {window_mark(x)}" for x in windows)
+            commands.extend(f"unmark {mark}" for mark in wrappers.values())
+            if active is not None:
+                commands.append(f"[con_id={active}] focus")
+            commands.extend(leave)
+        main.i3_command("; ".join(commands))
+
+
+def window_mark(con_id):
+    from .main import mark_prefix
+
+    return f"{mark_prefix}w{con_id}"
+
+
+def first_window(tree):
+    from .diff import Split
+
+    while isinstance(tree, Split):
+        tree = tree.children[0]
+    return tree
+
+
+def build(tree, commands, wrappers, mark=None):
+    """Commands to build tree (see diff.from_layout) around its first window.
+
+    Every split gets its first window wrapped in a new container with the
+    split's layout (marked with mark, if given), the first windows of the
+    other children moved next to it, then the children are built the same way.
+    Split children of splith / splitv get their container marked (for resize),
+    wrappers is {id(split): mark}.
+    """
+    from .diff import Split
+
+    if not isinstance(tree, Split):
+        return
+    anchor = first_window(tree)
+    layout = tree.layout or "splith"
+    commands.append(f"[con_id={anchor}] split {'v' if layout == 'splitv' else 'h'}")
+    if mark is not None:
+        commands.append(f"[con_id={anchor}] focus")
+        commands.append("focus parent")
+        commands.append(f"mark --add {mark}")
+    if layout in ("tabbed", "stacked"):
+        commands.append(
+            f"[con_id={anchor}] layout {'tabbed' if layout == 'tabbed' else 'stacking'}"
+        )
+    firsts = [first_window(x) for x in tree.children]
+    for previous, window in zip(firsts, firsts[1:]):
+        commands.append(
+            f"[con_id={window}] move container to mark {window_mark(previous)}"
+        )
+    for child, window in zip(tree.children, firsts):
+        child_mark = None
+        if isinstance(child, Split) and layout in ("splith", "splitv"):
+            wrappers[id(child)] = child_mark = f"{window_mark(window)}_parent"
+        build(child, commands, wrappers, child_mark)
+
+
+def resize(tree, commands, wrappers):
+    """Commands to give the children of every split their percents.
+
+    Front to back - 'resize set' takes from the next sibling,
+    so the last one ends up with what's left.
+    """
+    from .diff import Split, percent_tolerance
+
+    if not isinstance(tree, Split):
+        return
+    if tree.layout in ("splith", "splitv"):
+        dimension = "width" if tree.layout == "splith" else "height"
+        equal = 1.0 / len(tree.children)
+        if any(abs(p - equal) > percent_tolerance for p in tree.percents):
+            for child, percent in zip(tree.children[:-1], tree.percents):
+                if isinstance(child, Split):
+                    target = f'[con_mark="^{wrappers[id(child)]}$"]'
+                else:
+                    target = f"[con_id={child}]"
+                commands.append(
+                    f"{target} resize set {dimension} {int(round(percent * 100))} ppt"
+                )
+    for child in tree.children:
+        resize(child, commands, wrappers)
+
+
+backends = {x.name: x for x in [Swallow, Swap, Ipc]}
+
+
+def get(name=None, swap=False):
+    """Backend by name - by default swap if swap is set,
+    ipc on sway (no xdotool, no append_layout there), else swallow"""
+    if name is None:
+        if swap:
+            name = "swap"
+        elif os.environ.get("SWAYSOCK"):
+            name = "ipc"
+        else:
+            name = "swallow"
+    if name not in backends:
+        raise ValueError(
+            f"Unknown backend '{name}', choose from {', '.join(backends)}"
+        )
+    return backends[name]()
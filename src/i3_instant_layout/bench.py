@@ -0,0 +1,219 @@
+"""Benchmarks for i3-instant-layout.
+
+Times get_json for every registered layout (1 to 256 windows),
+the json serialization, and the full apply pipeline (per backend) against
+the fake i3 and fake xdotool from fakei3.py, so no X server or i3 is needed.
+
+Results are written as json, so runs (and versions) can be compared.
+
+Every backend must also stay within its budget of forks and i3 messages
+per layout switch (see budgets) - if it doesn't, --bench fails.
+
+Call with 'i3-instant-layout --bench [output.json]'.
+"""
+import json
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from . import layouts, __version__
+
+
+window_counts = list(range(1, 257))
+apply_window_counts = [1, 2, 3, 4, 8, 16, 32, 64, 128, 256]
+
+# backend: (forks, i3 messages) a layout switch may take, at most.
+# get_tree + append_layout + focus, xdotool unmap + map for swallow,
+# get_tree + one command for the others.
+budgets = {"swallow": (2, 3), "swap": (0, 2), "ipc": (0, 2)}
+
+
+def best_of(func, repeats, setup=None):
+    """Fastest of repeats calls to func, in seconds (setup is not timed)"""
+    best = None
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        took = time.perf_counter() - start
+        if best is None or took < best:
+            best = took
+    return best
+
+
+def bench_get_json(repeats):
+    result = {}
+    for layout_class in layouts.registry:
+        layout = layout_class()
+        result[layout_class.name] = timings = {}
+        for window_count in window_counts:
+            try:
+                timings[window_count] = best_of(
+                    lambda: layout.get_json(window_count), repeats
+                )
+            except Exception:  # layouts don't support every window count
+                timings[window_count] = None
+    return result
+
+
+def bench_serialize(repeats):
+    result = {}
+    for layout_class in layouts.registry:
+        layout = layout_class()
+        result[layout_class.name] = timings = {}
+        for window_count in window_counts:
+            try:
+                t = layout.get_json(window_count)
+            except Exception:
+                timings[window_count] = None
+                continue
+            timings[window_count] = best_of(
+                lambda: layouts.dump(t), repeats
+            )
+    return result
+
+
+@contextmanager
+def faked():
+    """main talking to the fake i3 and xdotool (see fakei3.py), with an
+    empty layout cache. Yields start(window_count), which puts a fresh
+    fake i3 with that many windows in place"""
+    from pathlib import Path
+    from . import cache, fakei3, main
+
+    old_i3, old_run, old_cache_dir = main._i3, main.run, cache.cache_dir
+    fakes = []
+
+    def stop_fakes():
+        while fakes:
+            fakes.pop().stop()
+
+    def start(window_count):
+        stop_fakes()
+        fakes.append(fakei3.FakeI3(window_count).start())
+        main.run = fakes[-1].run
+        main._i3 = None
+        main.get_i3()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache.cache_dir = Path(tmp)
+            yield start
+    finally:
+        stop_fakes()
+        main._i3, main.run, cache.cache_dir = old_i3, old_run, old_cache_dir
+
+
+def supported(layout_class, window_count):
+    """Can the layout do window_count windows? (auto: can any layout?)
+
+    It can't if get_json raises, or returns a remap order for another
+    number of windows (which apply_layout refuses).
+    """
+    from . import auto
+
+    if layout_class is layouts.Layout_Auto:
+        return any(supported(x, window_count) for x in auto.candidates())
+    try:
+        t = layout_class().get_json(window_count)
+    except Exception:  # layouts don't support every window count
+        return False
+    if isinstance(t, tuple):
+        return sorted(t[1]) == list(range(window_count))
+    return True
+
+
+def switch(layout_class, backend, adjust=False):
+    """A layout switch, the way apply_named does it, with a cold layout cache.
+
+    adjust=False always rebuilds, the diff path (see diff.py) is what
+    apply_named tries first.
+    """
+    from . import cache, main
+
+    cache._memory.clear()
+    workspace = main.get_workspace()
+    main.nuke_swallow_windows(workspace)
+    main.apply_layout(layout_class(), workspace, adjust=adjust, backend=backend)
+
+
+def bench_apply(repeats, backend):
+    """nuke_swallow_windows + apply_layout, with a cold layout cache,
+    against a fresh fake i3 each time"""
+    result = {}
+    with faked() as start:
+        for layout_class in layouts.registry:
+            result[layout_class.name] = timings = {}
+            for window_count in apply_window_counts:
+                if not supported(layout_class, window_count):
+                    timings[window_count] = None
+                    continue
+                timings[window_count] = best_of(
+                    lambda: switch(layout_class, backend),
+                    repeats,
+                    lambda: start(window_count),
+                )
+    return result
+
+
+def check_budgets(window_counts=apply_window_counts):
+    """Switch to every layout with every backend against the fake i3,
+    rebuilding and via the diff path.
+
+    Returns the switches that forked / sent i3 messages more often than
+    budgets allows, as ['backend layout window_count: why'].
+    Anything else going wrong raises.
+    """
+    from . import timings
+
+    failures = []
+    with faked() as start:
+        for backend, (forks, messages) in budgets.items():
+            for layout_class in layouts.registry:
+                for window_count in window_counts:
+                    if not supported(layout_class, window_count):
+                        continue
+                    for adjust in (False, True):
+                        start(window_count)
+                        try:
+                            with timings.budget(forks, messages):
+                                switch(layout_class, backend, adjust)
+                        except timings.OverBudget as e:
+                            failures.append(
+                                f"{backend} {layout_class.name} {window_count}: {e}"
+                            )
+    return failures
+
+
+def run_benchmarks(repeats=5):
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "repeats": repeats,
+        "unit": "seconds, best of repeats",
+        "get_json": bench_get_json(repeats),
+        "serialize": bench_serialize(repeats),
+        "apply_swallow": bench_apply(repeats, "swallow"),
+        "apply_swap": bench_apply(repeats, "swap"),
+        "apply_ipc": bench_apply(repeats, "ipc"),
+        "budgets": budgets,
+        "over_budget": check_budgets(),
+    }
+
+
+def main(args):
+    results = run_benchmarks()
+    if args:
+        with open(args[0], "w") as op:
+            json.dump(results, op, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print("")
+    for failure in results["over_budget"]:
+        print(f"Over budget: {failure}", file=sys.stderr)
+    if results["over_budget"]:
+        sys.exit(1)
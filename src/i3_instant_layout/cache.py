@@ -0,0 +1,100 @@
+"""Serialized layouts, cached by (layout name, window count).
+
+A layout's json only depends on the layout and the window count,
+so we keep it in memory (LRU, for the daemon) and on disk
+(one small file per entry, for one shot runs).
+
+The disk cache lives in a directory named after the package version
+and the modification time of the layout definitions,
+so changing either invalidates it.
+"""
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from . import layouts, __version__
+
+
+cache_dir = Path("~/.local/share/i3-instant-layout/layout_cache").expanduser()
+max_in_memory = 256
+
+_memory = OrderedDict()
+
+
+def compile_layout(layout, window_count, marked=False):
+    """Run the layout, returns (json, remap_order, marks).
+
+    json is None if the layout declined (returned False),
+    remap_order is None if the layout did not return one,
+    marks are the placeholder marks (see main.mark_swallow_nodes) if marked.
+    """
+    from .main import mark_swallow_nodes
+
+    t = layout.get_json(window_count)
+    if isinstance(t, tuple):
+        layout_dict, remap_order = t
+        remap_order = list(remap_order)
+    else:
+        layout_dict, remap_order = t, None
+    if layout_dict is False:
+        return None, remap_order, []
+    marks = mark_swallow_nodes(layout_dict) if marked else []
+    return layouts.dump(layout_dict), remap_order, marks
+
+
+def stamp_dir():
+    """Cache directory for this version / these layout definitions"""
+    mtime = os.stat(layouts.__file__).st_mtime_ns
+    return cache_dir / f"{__version__}-{mtime}"
+
+
+def disk_path(key):
+    name, window_count, marked = key
+    return stamp_dir() / f"{name}-{window_count}{'-marked' if marked else ''}.json"
+
+
+def load_from_disk(key):
+    try:
+        with open(disk_path(key), "r") as op:
+            header = json.loads(op.readline())
+            layout_json = op.read()
+    except (OSError, ValueError):
+        return None
+    remap_order, marks = header
+    return (layout_json or None), remap_order, marks
+
+
+def store_on_disk(key, entry):
+    layout_json, remap_order, marks = entry
+    target = disk_path(key)
+    try:
+        if not target.parent.exists():
+            if cache_dir.exists():  # outdated stamps
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            target.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=target.parent, suffix=".tmp", delete=False
+        ) as op:
+            op.write(json.dumps([remap_order, marks]) + "\n")
+            op.write(layout_json or "")
+        os.replace(op.name, target)
+    except OSError:  # a cache is no reason to fail
+        pass
+
+
+def get_compiled(layout, window_count, marked=False):
+    """Cached compile_layout()"""
+    key = (layout.name, window_count, marked)
+    if key in _memory:
+        _memory.move_to_end(key)
+        return _memory[key]
+    entry = load_from_disk(key)
+    if entry is None:
+        entry = compile_layout(layout, window_count, marked)
+        store_on_disk(key, entry)
+    _memory[key] = entry
+    if len(_memory) > max_in_memory:
+        _memory.popitem(last=False)
+    return entry
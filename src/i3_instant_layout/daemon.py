@@ -0,0 +1,193 @@
+"""A long running i3-instant-layout.
+
+The daemon keeps the layouts, the usage counters and one i3 connection
+around, so applying a layout does not pay the python startup.
+
+The protocol is one line per connection: the layout name (optionally
+followed by --notification, --swap and/or --backend=NAME - other flags are
+an error), answered by one line, 'ok <layout>' or 'error <message>'.
+So you can drive it without python at all:
+
+    echo mainLeft | socat - UNIX-CONNECT:$XDG_RUNTIME_DIR/i3-instant-layout.sock
+
+Whoever can connect can drive it, so the socket lives in a directory only we
+can get into: XDG_RUNTIME_DIR, or one of our own (0700) in the shared /tmp.
+A client that takes longer than request_timeout to send its line is dropped.
+"""
+import os
+import socket
+import stat
+import sys
+from pathlib import Path
+
+
+if os.environ.get("XDG_RUNTIME_DIR"):
+    socket_file = Path(os.environ["XDG_RUNTIME_DIR"]) / "i3-instant-layout.sock"
+else:
+    socket_file = (
+        Path(os.environ.get("TMPDIR", "/tmp"))
+        / f"i3-instant-layout-{os.getuid()}"
+        / "daemon.sock"
+    )
+request_timeout = 2.0  # seconds
+
+
+def check_private(directory):
+    """Raise PermissionError unless directory is ours and nobody else's"""
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(f"{directory} is not a private directory")
+
+
+def split_request(line):
+    """Split a request line into (words, flags)"""
+    words = line.split()
+    return (
+        [x for x in words if not x.startswith("--")],
+        [x for x in words if x.startswith("--")],
+    )
+
+
+def unknown_flags(flags):
+    """The flags the protocol doesn't know (e.g. --dry-run)"""
+    return [
+        x
+        for x in flags
+        if x not in ("--notification", "--swap") and not x.startswith("--backend=")
+    ]
+
+
+def handle(line):
+    """Process one request line, return the reply line"""
+    from . import main
+
+    words, flags = split_request(line)
+    if not words:
+        return "error empty request"
+    unknown = unknown_flags(flags)
+    if unknown:
+        return f"error unknown flag {unknown[0]}"
+    try:
+        applied = main.apply_named(
+            words[0],
+            show_notification="--notification" in flags,
+            swap="--swap" in flags,
+            backend=main.backend_flag(flags),
+        )
+    except Exception as e:
+        return f"error {e}"
+    if applied is None:
+        return "error Could not find the requested layout"
+    return f"ok {applied}"
+
+
+def serve(path=socket_file, watch_too=False, swap=False, backend=None):
+    """Listen on the unix socket at path until killed.
+
+    With watch_too, also keep the workspaces in their layouts (see watch.py),
+    swap and backend are for those re-layouts.
+    """
+    import threading
+    from . import main
+
+    path = Path(path)
+    try:
+        path.parent.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    check_private(path.parent)
+    if path.exists():
+        try:
+            send("", path)
+        except OSError:  # stale socket from a crashed daemon
+            path.unlink()
+        else:
+            raise ValueError(f"Daemon already listening on {path}")
+
+    main.keep_usage_warm()
+    main.get_i3()
+    lock = threading.Lock()  # one apply at a time
+    if watch_too:
+        from . import watch
+
+        threading.Thread(
+            target=watch.watch, args=(swap, lock, backend), daemon=True
+        ).start()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    os.chmod(path, 0o600)
+    server.listen(8)
+    try:
+        while True:
+            conn, _ = server.accept()
+            conn.settimeout(request_timeout)  # an idle client must not block us
+            with conn:
+                try:
+                    request = conn.makefile("rb").readline()
+                except OSError:  # timed out
+                    continue
+                with lock:
+                    reply = handle(request.decode("utf-8", errors="replace"))
+                try:
+                    conn.sendall((reply + "\n").encode("utf-8"))
+                except OSError:  # client went away
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        path.unlink()
+
+
+def send(line, path=socket_file):
+    """Send one request line to a running daemon, return its reply.
+
+    Raises OSError if no daemon is listening (or its directory isn't private).
+    """
+    check_private(Path(path).parent)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(path))
+        client.sendall((line.strip() + "\n").encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        reply = b""
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    finally:
+        client.close()
+    return reply.decode("utf-8", errors="replace").strip()
+
+
+def client(query):
+    """Have the daemon apply query, or do it in process if there is no daemon"""
+    unknown = unknown_flags(split_request(query)[1])
+    if unknown:  # e.g. --dry-run - rather than applying the layout after all
+        print(f"--client doesn't take {unknown[0]}", file=sys.stderr)
+        return False
+    try:
+        reply = send(query)
+    except OSError:
+        from . import main
+
+        words, flags = split_request(query)
+        return (
+            main.apply_named(
+                words[0],
+                show_notification="--notification" in flags,
+                swap="--swap" in flags,
+                backend=main.backend_flag(flags),
+            )
+            is not None
+        )
+    if not reply.startswith("ok"):
+        print(reply, file=sys.stderr)
+        return False
+    return True
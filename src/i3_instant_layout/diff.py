@@ -0,0 +1,170 @@
+"""Compare a workspace with the layout we're about to apply.
+
+If the workspace already has the layout's structure, we only need to
+swap windows, change split directions and resize - or do nothing at all,
+instead of rebuilding (and redrawing) everything.
+
+Both trees are normalized first: split containers with just one child
+are dropped (they don't change what you see) and percents are what i3
+makes of them.
+"""
+from .layouts import fix_percent, flatten
+
+
+percent_tolerance = 0.01
+
+
+class Split:
+    """A split container in normalized form"""
+
+    def __init__(self, layout, children, percents, con_id=None):
+        self.layout = layout  # None: don't care (top level of a layout)
+        self.children = children  # Split, or a window id for windows
+        self.percents = percents
+        self.con_id = con_id  # only for the workspace side
+
+
+class Unreachable(Exception):
+    """The layout can't be had by moving windows around"""
+
+
+def normalize(layout, children, percents, con_id=None):
+    if len(children) == 1:
+        return children[0]
+    return Split(layout, children, fix_percent(percents), con_id)
+
+
+def from_workspace(con, ids="window"):
+    """Normalized tiling tree of a workspace (or container).
+
+    Windows are their X11 ids (ids="window") or con_ids (ids="id").
+    Empty containers (e.g. swallow placeholders) make it unreachable.
+    """
+    if not con.nodes:
+        if not (con.window or con.ipc_data.get("app_id")) or con.ipc_data.get(
+            "swallows"
+        ):
+            raise Unreachable()
+        return getattr(con, ids)
+    return normalize(
+        con.layout,
+        [from_workspace(x, ids) for x in con.nodes],
+        [x.percent for x in con.nodes],
+        con.id,
+    )
+
+
+def from_layout(layout_dict, windows, drop_empty=False):
+    """Normalized tree of an append_layout dict (or list of them),
+    with the windows filling the swallow placeholders in order.
+
+    Placeholders left over make it unreachable - unless drop_empty,
+    then they (and containers left empty) are dropped.
+    """
+    windows = iter(windows)
+
+    def convert(n):
+        if "swallows" in n:
+            try:
+                return next(windows)
+            except StopIteration:  # a placeholder would remain
+                if drop_empty:
+                    return None
+                raise Unreachable()
+        children = flatten(n.get("nodes", []))
+        return convert_children(n.get("layout"), children)
+
+    def convert_children(layout, children):
+        converted = [(convert(x), x.get("percent")) for x in children]
+        if drop_empty:
+            converted = [(c, p) for c, p in converted if c is not None]
+            if not converted:
+                return None
+        elif not converted:
+            raise Unreachable()
+        return normalize(layout, [c for c, p in converted], [p for c, p in converted])
+
+    result = convert_children(None, flatten([layout_dict]))
+    if result is None or next(windows, None) is not None:
+        raise Unreachable()
+    return result
+
+
+def compare(current, target, swaps, commands, ids="window"):
+    """Walk both trees, collecting window pairs to swap and the
+    split/resize commands. Raises Unreachable if the structure differs"""
+    if not isinstance(current, Split) or not isinstance(target, Split):
+        if isinstance(current, Split) or isinstance(target, Split):
+            raise Unreachable()
+        swaps.append((current, target))
+        return
+    if len(current.children) != len(target.children):
+        raise Unreachable()
+    layout = current.layout
+    if target.layout is not None and target.layout != current.layout:
+        layout = target.layout
+        commands.append(
+            # 'layout' on a child changes its parent
+            f"{criteria(current.children[0], target.children[0], ids)} "
+            f"layout {layout}"
+        )
+    if layout in ("splith", "splitv"):
+        dimension = "width" if layout == "splith" else "height"
+        pairs = list(zip(current.children, target.children))
+        for (cur, tgt), cur_p, tgt_p in zip(
+            pairs, current.percents, target.percents
+        ):
+            if abs(cur_p - tgt_p) > percent_tolerance:
+                commands.append(
+                    f"{criteria(cur, tgt, ids)} resize set {dimension} "
+                    f"{int(round(tgt_p * 100))} ppt"
+                )
+    for cur, tgt in zip(current.children, target.children):
+        compare(cur, tgt, swaps, commands, ids)
+
+
+def criteria(current, target, ids="window"):
+    """Address a child position - after the swaps ran"""
+    if isinstance(current, Split):
+        return f"[con_id={current.con_id}]"
+    if ids == "id":
+        return f"[con_id={target}]"
+    return f'[id="{target}"]'
+
+
+def swap_commands(swaps, ids="window"):
+    """Turn (current window, target window) per position into swaps"""
+    current = [c for c, t in swaps]
+    target = [t for c, t in swaps]
+    if sorted(current) != sorted(target):
+        raise Unreachable()
+    commands = []
+    for ii, wanted in enumerate(target):
+        if current[ii] != wanted:
+            jj = current.index(wanted, ii + 1)
+            if ids == "id":
+                commands.append(
+                    f"[con_id={current[ii]}] swap container with con_id {wanted}"
+                )
+            else:
+                commands.append(
+                    f'[id="{current[ii]}"] swap container with id {wanted}'
+                )
+            current[ii], current[jj] = current[jj], current[ii]
+    return commands
+
+
+def plan(workspace, layout_dict, windows, ids="window"):
+    """i3 commands that turn workspace into layout_dict filled with windows.
+
+    [] if it already is, None if that takes a full re-layout.
+    """
+    try:
+        current = from_workspace(workspace, ids)
+        target = from_layout(layout_dict, windows)
+        swaps = []
+        commands = []
+        compare(current, target, swaps, commands, ids)
+        return swap_commands(swaps, ids) + commands
+    except Unreachable:
+        return None
@@ -0,0 +1,822 @@
+"""A fake i3 - for tests and benchmarks without X or i3.
+
+FakeI3 listens on a unix socket and speaks the i3 IPC protocol.
+get_tree answers with a scriptable tree (add_workspace, add_window),
+the commands i3-instant-layout sends (append_layout, kill, swap, mark,
+focus, split, layout, move to mark, resize, ...) change it the way i3
+would - close enough for our purposes - and every request is recorded.
+Unknown commands fail, like they do on i3.
+
+xdotool, xprop and notify-send are faked as well: FakeI3.run(argv) in
+process (e.g. as main.run), or with tools=True, scripts on the PATH that
+forward their arguments to the fake. 'xdotool windowunmap' takes a window
+out of the tree, 'windowmap' puts it into the oldest swallow placeholder,
+like i3 does.
+
+    with FakeI3(windows=4) as fake:  # I3SOCK points to the fake
+        main.apply_named("mainLeft")
+        fake.requests  # [(message type, payload)]
+        fake.forks  # [argv]
+"""
+import itertools
+import json
+import os
+import re
+import socket
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+
+header = struct.Struct("=6sII")
+magic = b"i3-ipc"
+
+RUN_COMMAND = 0
+GET_WORKSPACES = 1
+SUBSCRIBE = 2
+GET_OUTPUTS = 3
+GET_TREE = 4
+GET_MARKS = 5
+GET_BAR_CONFIG = 6
+GET_VERSION = 7
+
+tool_names = ["xdotool", "xprop", "notify-send"]
+fork_prefix = "nop fake-fork "
+
+
+class FakeError(Exception):
+    """A command the fake (or i3) refuses"""
+
+
+def con(id, **kwargs):
+    result = {
+        "id": id,
+        "type": "con",
+        "name": None,
+        "window": None,
+        "layout": "splith",
+        "percent": None,
+        "rect": {"x": 0, "y": 0, "width": 0, "height": 0},
+        "focused": False,
+        "focus": [],
+        "marks": [],
+        "swallows": [],
+        "nodes": [],
+        "floating_nodes": [],
+    }
+    result.update(kwargs)
+    return result
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def send_message(sock, message_type, payload):
+    payload = payload.encode("utf-8")
+    sock.sendall(header.pack(magic, len(payload), message_type) + payload)
+
+
+def recv_message(sock):
+    """(message type, payload), None on EOF"""
+    data = recv_exactly(sock, header.size)
+    if data is None:
+        return None
+    _, length, message_type = header.unpack(data)
+    payload = recv_exactly(sock, length) if length else b""
+    if payload is None:
+        return None
+    return message_type, payload.decode("utf-8")
+
+
+def split_commands(text):
+    """Split a command list at the ; outside of quotes and criteria"""
+    parts = []
+    current = ""
+    quoted = bracket = False
+    for c in text:
+        if c == '"':
+            quoted = not quoted
+        elif c == "[" and not quoted:
+            bracket = True
+        elif c == "]" and not quoted:
+            bracket = False
+        if c == ";" and not quoted and not bracket:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += c
+    parts.append(current.strip())
+    return [x for x in parts if x]
+
+
+def unsupported(words):
+    raise FakeError(f"Command not supported by the fake: {' '.join(words)}")
+
+
+class FakeI3:
+    def __init__(self, windows=0, width=1920, height=1080, tools=False):
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.window_ids = itertools.count(0x1000)
+        self.requests = []
+        self.forks = []
+        self.tools = tools
+        self.unmapped = {}  # X11 id -> con
+        self.parents = {}  # id(con) -> parent con
+        self.by_id = {}  # con_id -> con, X11 id -> con, mark -> con
+        self.by_window = {}  # (may include detached ones, see attached())
+        self.by_mark = {}
+        self.current = None  # the focused con
+        self.tree = con(
+            next(self.ids),
+            type="root",
+            name="root",
+            rect={"x": 0, "y": 0, "width": width, "height": height},
+        )
+        self.output = con(
+            next(self.ids), type="output", name="fake", rect=dict(self.tree["rect"])
+        )
+        self.attach(self.tree, self.output)
+        self.focus(self.add_workspace("1"))
+        for _ in range(windows):
+            self.add_window()
+        self.server = None
+        self.directory = None
+        self.old_environ = None
+
+    # the tree
+
+    def walk(self, start=None):
+        """(con, parent), depth first"""
+        todo = [(start or self.tree, None)]
+        while todo:
+            c, parent = todo.pop()
+            yield c, parent
+            todo.extend((x, c) for x in reversed(c["floating_nodes"]))
+            todo.extend((x, c) for x in reversed(c["nodes"]))
+
+    def find(self, predicate):
+        for c, _ in self.walk():
+            if predicate(c):
+                return c
+        return None
+
+    def parent_of(self, target):
+        return self.parents.get(id(target))
+
+    def ancestors(self, target):
+        result = []
+        parent = self.parent_of(target)
+        while parent is not None:
+            result.append(parent)
+            parent = self.parent_of(parent)
+        return result
+
+    def workspace(self, name=None):
+        """The workspace called name - the focused one by default"""
+        if name is None:
+            focused = self.focused()
+            if focused["type"] == "workspace":
+                return focused
+            return next(x for x in self.ancestors(focused) if x["type"] == "workspace")
+        return self.find(lambda c: c["type"] == "workspace" and c["name"] == name)
+
+    def focused(self):
+        return self.current
+
+    def add_workspace(self, name):
+        with self.lock:
+            workspace = con(
+                next(self.ids),
+                type="workspace",
+                name=name,
+                rect=dict(self.output["rect"]),
+            )
+            self.attach(self.output, workspace)
+            return workspace
+
+    def add_window(self, workspace=None, app_id=None, floating=False):
+        """A new window on workspace (name, default: the focused one).
+
+        X11 (window id) unless app_id is given (a wayland window).
+        Returns the con.
+        """
+        with self.lock:
+            target = self.workspace(workspace)
+            window = None if app_id else next(self.window_ids)
+            c = con(next(self.ids), window=window, name=f"window {window or app_id}")
+            if app_id:
+                c["app_id"] = app_id
+            if floating:
+                wrapper = con(next(self.ids), type="floating_con")
+                self.attach(target, wrapper, "floating_nodes")
+                self.attach(wrapper, c)
+            else:
+                self.attach(target, c)
+            if not self.focused() or self.focused() is target:
+                self.focus(c)
+            return c
+
+    def focus(self, target):
+        if self.current is not None:
+            self.current["focused"] = False
+        self.current = target
+        target["focused"] = True
+        child = target
+        for parent in self.ancestors(target):
+            if child["id"] in parent["focus"]:
+                parent["focus"].remove(child["id"])
+            parent["focus"].insert(0, child["id"])
+            child = parent
+
+    def position(self, target):
+        """(parent, "nodes" or "floating_nodes", index) - by identity,
+        equal looking placeholders are not the same container"""
+        parent = self.parent_of(target)
+        for key in ("nodes", "floating_nodes"):
+            for ii, x in enumerate(parent[key]):
+                if x is target:
+                    return parent, key, ii
+        raise FakeError("Container not in the tree")
+
+    def attach(self, parent, c, key="nodes", index=None):
+        """Put c (and what's below it) into parent"""
+        if index is None:
+            parent[key].append(c)
+        else:
+            parent[key].insert(index, c)
+        parent["focus"].append(c["id"])
+        for x, x_parent in self.walk(c):
+            self.parents[id(x)] = parent if x_parent is None else x_parent
+            self.index(x)
+
+    def index(self, c):
+        self.by_id[c["id"]] = c
+        if c["window"]:
+            self.by_window[c["window"]] = c
+        for mark in c["marks"]:
+            self.by_mark[mark] = c
+
+    def attached(self, c):
+        """Is c (still) in the tree?"""
+        while c is not self.tree:
+            c = self.parents.get(id(c))
+            if c is None:
+                return False
+        return True
+
+    def detach(self, target):
+        """Take target out of the tree, closing containers left empty"""
+        if self.parent_of(target) is None:
+            return
+        parent, key, ii = self.position(target)
+        del parent[key][ii]
+        del self.parents[id(target)]
+        if target["id"] in parent["focus"]:
+            parent["focus"].remove(target["id"])
+        if target["focused"]:
+            self.focus(parent)
+        if (
+            parent["type"] in ("con", "floating_con")
+            and not parent["nodes"]
+            and not parent["floating_nodes"]
+            and not parent["window"]
+            and not parent["swallows"]
+        ):
+            self.detach(parent)
+
+    def insert_after(self, target, new):
+        parent, key, ii = self.position(target)
+        self.attach(parent, new, key, ii + 1)
+
+    def replace(self, old, new):
+        parent, key, ii = self.position(old)
+        parent[key][ii] = new
+        del self.parents[id(old)]
+        self.parents[id(new)] = parent
+        parent["focus"] = [new["id"] if x == old["id"] else x for x in parent["focus"]]
+
+    def place(self, c, x, y, width, height):
+        """Fill in the rects, the way geometry.py sees it"""
+        from .geometry import split
+        from .layouts import fix_percent
+
+        c["rect"] = {"x": x, "y": y, "width": width, "height": height}
+        children = c["nodes"]
+        if not children:
+            return
+        percents = fix_percent([n["percent"] for n in children])
+        if c["layout"] == "splith":
+            for n, (nx, nw) in zip(children, split(x, width, percents)):
+                self.place(n, nx, y, nw, height)
+        elif c["layout"] == "splitv":
+            for n, (ny, nh) in zip(children, split(y, height, percents)):
+                self.place(n, x, ny, width, nh)
+        else:
+            for n in children:
+                self.place(n, x, y, width, height)
+
+    def get_tree(self):
+        with self.lock:
+            for workspace in self.output["nodes"]:
+                self.place(workspace, **self.output["rect"])
+            return json.dumps(self.tree)
+
+    def get_workspaces(self):
+        with self.lock:
+            focused = self.workspace()
+            return json.dumps(
+                [
+                    {
+                        "id": w["id"],
+                        "name": w["name"],
+                        "num": int(w["name"]) if w["name"].isdigit() else -1,
+                        "focused": w is focused,
+                        "visible": w is focused,
+                        "urgent": False,
+                        "rect": w["rect"],
+                        "output": self.output["name"],
+                    }
+                    for w in self.output["nodes"]
+                ]
+            )
+
+    # commands
+
+    def match(self, criteria):
+        """The cons matching an i3 criteria string (the part in [])"""
+        tests = []
+        candidates = None
+        for key, value in re.findall(r'(\w+)=("[^"]*"|\S+)', criteria):
+            value = value.strip('"')
+            if key == "con_id":
+                tests.append(lambda c, v=value: str(c["id"]) == v)
+                candidates = [self.by_id.get(int(value))]
+            elif key == "id":
+                tests.append(lambda c, v=value: str(c["window"]) == v)
+                candidates = [self.by_window.get(int(value, 0))]
+            elif key == "con_mark":
+                tests.append(
+                    lambda c, v=value: any(re.search(v, m) for m in c["marks"])
+                )
+                if candidates is None:
+                    candidates = list(self.by_mark.values())
+            else:
+                raise FakeError(f"Criterion not supported by the fake: {key}")
+        if candidates is None:
+            candidates = [c for c, _ in self.walk()]
+        result = []
+        for c in candidates:
+            if c is not None and c not in result and self.attached(c):
+                if all(t(c) for t in tests):
+                    result.append(c)
+        return result
+
+    def marked(self, mark):
+        found = self.by_mark.get(mark)
+        if found is None or mark not in found["marks"] or not self.attached(found):
+            raise FakeError(f"No container with mark {mark}")
+        return found
+
+    def command(self, text):
+        """Run an i3 command list, returns the replies"""
+        with self.lock:
+            replies = []
+            for part in split_commands(text):
+                try:
+                    self.execute(part)
+                    replies.append({"success": True})
+                except FakeError as e:
+                    replies.append({"success": False, "error": str(e)})
+            return replies
+
+    def execute(self, part):
+        m = re.match(r"(?:\[([^\]]*)\])?\s*(.*)$", part, re.S)
+        criteria, cmd = m.groups()
+        if criteria is not None:
+            targets = self.match(criteria)
+            if not targets:
+                raise FakeError("No window matches given criteria")
+        else:
+            targets = [self.focused()]
+        words = cmd.split()
+        if not words:
+            raise FakeError("Empty command")
+        if words[0] == "nop":
+            return
+        if words[0] == "append_layout":
+            self.append_layout(cmd[len("append_layout") :].strip().strip('"'))
+            return
+        for target in targets:
+            self.execute_on(target, words)
+
+    def execute_on(self, target, words):
+        handler = self.command_handlers.get(words[0])
+        if handler is None:
+            unsupported(words)
+        handler(self, target, words)
+
+    # one per command, see command_handlers
+
+    def cmd_kill(self, target, words):
+        if len(words) != 1:
+            unsupported(words)
+        if target["window"] and target["window"] in self.unmapped:
+            del self.unmapped[target["window"]]
+        self.detach(target)
+
+    def cmd_focus(self, target, words):
+        if words == ["focus"]:
+            self.focus(target)
+        elif words == ["focus", "parent"]:
+            parent = self.parent_of(target)
+            if parent["type"] not in ("output", "root"):
+                self.focus(parent)
+        else:
+            unsupported(words)
+
+    def cmd_mark(self, target, words):
+        mark = words[-1]  # marks are unique
+        previous = self.by_mark.get(mark)
+        if previous is not None and mark in previous["marks"]:
+            previous["marks"].remove(mark)
+        if "--add" not in words:
+            for x in target["marks"]:
+                del self.by_mark[x]
+            target["marks"] = []
+        target["marks"].append(mark)
+        self.by_mark[mark] = target
+
+    def cmd_unmark(self, target, words):
+        # the mark, wherever it is - or all of them
+        for mark in [words[1]] if len(words) > 1 else list(self.by_mark):
+            c = self.by_mark.pop(mark, None)
+            if c is not None and mark in c["marks"]:
+                c["marks"].remove(mark)
+
+    def cmd_swap(self, target, words):
+        if words[1:3] != ["container", "with"] or len(words) != 5:
+            unsupported(words)
+        kind, value = words[3], words[4]
+        if kind == "mark":
+            other = self.marked(value)
+        elif kind in ("id", "con_id"):
+            other = (self.by_window if kind == "id" else self.by_id).get(int(value, 0))
+            if other is not None and not self.attached(other):
+                other = None
+        else:
+            raise FakeError(f"Can't swap with {kind}")
+        if other is None:
+            raise FakeError("Swap target not found")
+        self.swap(target, other)
+
+    def cmd_split(self, target, words):
+        self.split(target, "splitv" if words[1][0] == "v" else "splith")
+
+    def cmd_layout(self, target, words):
+        layouts = {"stacking": "stacked", "tabbed": "tabbed"}
+        layout = layouts.get(words[1], words[1])
+        if layout not in ("splith", "splitv", "tabbed", "stacked"):
+            raise FakeError(f"Layout not supported by the fake: {words[1]}")
+        # i3 changes the parent's layout - unless it's a workspace
+        if target["type"] != "workspace":
+            target = self.parent_of(target)
+        target["layout"] = layout
+
+    def cmd_move(self, target, words):
+        if words[1:4] != ["container", "to", "mark"] or len(words) != 5:
+            unsupported(words)
+        self.move_to_mark(target, words[4])
+
+    def cmd_resize(self, target, words):
+        if words[1] != "set" or len(words) != 5 or words[4] != "ppt":
+            unsupported(words)
+        self.resize(target, words[2], int(words[3]))
+
+    def cmd_floating(self, target, words):
+        self.floating(target, words[1])
+
+    command_handlers = {
+        "kill": cmd_kill,
+        "focus": cmd_focus,
+        "mark": cmd_mark,
+        "unmark": cmd_unmark,
+        "swap": cmd_swap,
+        "split": cmd_split,
+        "layout": cmd_layout,
+        "move": cmd_move,
+        "resize": cmd_resize,
+        "floating": cmd_floating,
+    }
+
+    def append_layout(self, path):
+        try:
+            with open(path) as op:
+                layout = json.load(op)
+        except (OSError, ValueError) as e:
+            raise FakeError(f"Could not load layout: {e}")
+
+        def convert(n):
+            c = con(
+                next(self.ids),
+                layout=n.get("layout", "splith"),
+                percent=n.get("percent"),
+                marks=list(n.get("marks", [])),
+                swallows=[{"class": "."}] if "swallows" in n else [],
+            )
+            for x in n.get("nodes", []):
+                c["nodes"].extend(convert_all(x))
+            c["focus"] = [x["id"] for x in c["nodes"]]
+            return c
+
+        def convert_all(n):
+            if isinstance(n, list):
+                return [c for x in n for c in convert_all(x)]
+            return [convert(n)]
+
+        focused = self.focused()
+        parent = focused if focused["type"] == "workspace" else self.parent_of(focused)
+        for c in convert_all(layout):
+            self.attach(parent, c)
+
+    def swap(self, a, b):
+        if a is b:
+            return
+        placeholder = con(-1)
+        self.replace(a, placeholder)
+        self.replace(b, a)
+        self.replace(placeholder, b)
+        a["percent"], b["percent"] = b["percent"], a["percent"]
+
+    def split(self, target, layout):
+        parent = self.parent_of(target)
+        if len(parent["nodes"]) == 1 and parent["layout"] in ("splith", "splitv"):
+            parent["layout"] = layout  # i3 just changes the orientation then
+            return
+        wrapper = con(next(self.ids), layout=layout, percent=target["percent"])
+        self.replace(target, wrapper)
+        target["percent"] = None
+        self.attach(wrapper, target)
+
+    def move_to_mark(self, target, mark):
+        destination = self.marked(mark)
+        if destination is target:
+            return
+        if destination["nodes"]:  # i3 descends into the focused child
+            focus = destination["focus"][0]
+            destination = next(x for x in destination["nodes"] if x["id"] == focus)
+        was_focused = target["focused"]
+        self.detach(target)
+        target["percent"] = None
+        self.insert_after(destination, target)
+        if was_focused:
+            self.focus(target)
+
+    def resize(self, target, dimension, ppt):
+        layout = "splith" if dimension == "width" else "splitv"
+        child, parent = target, self.parent_of(target)
+        while parent is not None and parent["layout"] != layout:
+            child, parent = parent, self.parent_of(parent)
+        if parent is None or parent["type"] not in ("con", "workspace"):
+            raise FakeError("No container to resize in that direction")
+        from .layouts import fix_percent
+
+        siblings = parent["nodes"]
+        for n, p in zip(siblings, fix_percent([n["percent"] for n in siblings])):
+            n["percent"] = p
+        if len(siblings) < 2:
+            return
+        ii = self.position(child)[2]
+        neighbour = siblings[ii + 1] if ii + 1 < len(siblings) else siblings[ii - 1]
+        delta = ppt / 100 - child["percent"]
+        child["percent"] += delta
+        neighbour["percent"] -= delta
+
+    def floating(self, target, mode):
+        parent = self.parent_of(target)
+        is_floating = parent["type"] == "floating_con"
+        if mode == "toggle":
+            mode = "disable" if is_floating else "enable"
+        if mode == "disable" and is_floating:
+            workspace = self.ancestors(target)
+            workspace = next(x for x in workspace if x["type"] == "workspace")
+            self.detach(target)
+            self.attach(workspace, target)
+        elif mode == "enable" and not is_floating:
+            workspace = next(
+                x for x in self.ancestors(target) if x["type"] == "workspace"
+            )
+            self.detach(target)
+            wrapper = con(next(self.ids), type="floating_con")
+            self.attach(workspace, wrapper, "floating_nodes")
+            self.attach(wrapper, target)
+
+    # the fake X11 tools
+
+    def run(self, argv):
+        """Do what argv (xdotool & co) would have done. Raises like check_call.
+
+        Counts as a fork (see timings.counts), like main.run would.
+        """
+        from . import timings
+
+        with timings.stage(f"fork:{os.path.basename(argv[0])}"):
+            self.fork(argv)
+
+    def fork(self, argv):
+        import subprocess
+
+        with self.lock:
+            self.forks.append(list(argv))
+            tool = os.path.basename(argv[0])
+            if tool not in tool_names:
+                raise FileNotFoundError(argv[0])
+            if tool == "xdotool":
+                args = list(argv[1:])
+                placeholders = self.placeholders()
+                while args:
+                    action = args.pop(0)
+                    window = int(args.pop(0), 0)
+                    if window not in self.unmapped and not self.find(
+                        lambda c: c["window"] == window
+                    ):  # BadWindow - xdotool stops right there
+                        raise subprocess.CalledProcessError(1, argv)
+                    if action == "windowunmap":
+                        self.unmap(window)
+                    elif action == "windowmap":
+                        self.map(window, placeholders)
+                    else:
+                        raise subprocess.CalledProcessError(1, argv)
+
+    def unmap(self, window):
+        c = self.find(lambda c: c["window"] == window)
+        if c is not None:
+            self.detach(c)
+            self.unmapped[window] = c
+
+    def placeholders(self):
+        """Swallow placeholders, oldest first"""
+        return sorted(
+            (x for x, _ in self.walk() if x["swallows"] and not x["nodes"]),
+            key=lambda x: x["id"],
+        )
+
+    def map(self, window, placeholders):
+        """Map window - into the first of placeholders, if any (it's used up)"""
+        c = self.unmapped.pop(window, None)
+        if c is None:
+            return
+        if placeholders:
+            placeholder = placeholders.pop(0)
+            placeholder.update(
+                swallows=[],
+                window=c["window"],
+                name=c["name"],
+            )
+            self.index(placeholder)
+            if "app_id" in c:
+                placeholder["app_id"] = c["app_id"]
+        else:
+            self.attach(self.workspace(), c)
+
+    def install_tools(self, directory):
+        """Put xdotool & co into directory - they forward to this fake"""
+        directory = Path(directory)
+        for name in tool_names:
+            path = directory / name
+            path.write_text(tool_script)
+            path.chmod(0o755)
+
+    # the server
+
+    def handle(self, message_type, payload):
+        if message_type == RUN_COMMAND and payload.startswith(fork_prefix):
+            try:
+                self.fork(json.loads(payload[len(fork_prefix) :]))
+                return json.dumps([{"success": True}])
+            except Exception as e:
+                return json.dumps([{"success": False, "error": str(e)}])
+        with self.lock:
+            self.requests.append((message_type, payload))
+        if message_type == RUN_COMMAND:
+            return json.dumps(self.command(payload))
+        elif message_type == GET_TREE:
+            return self.get_tree()
+        elif message_type == GET_WORKSPACES:
+            return self.get_workspaces()
+        elif message_type == GET_VERSION:
+            return json.dumps(
+                {
+                    "major": 4,
+                    "minor": 20,
+                    "patch": 0,
+                    "human_readable": "4.20 (fake)",
+                    "loaded_config_file_name": "",
+                }
+            )
+        elif message_type == SUBSCRIBE:
+            return json.dumps({"success": True})
+        elif message_type == GET_OUTPUTS:
+            return json.dumps(
+                [{"name": "fake", "active": True, "rect": self.output["rect"]}]
+            )
+        elif message_type == GET_MARKS:
+            return json.dumps([m for c, _ in self.walk() for m in c["marks"]])
+        return json.dumps({"success": False, "error": "not supported by the fake"})
+
+    def serve_connection(self, conn):
+        with conn:
+            while True:
+                message = recv_message(conn)
+                if message is None:
+                    return
+                try:
+                    send_message(conn, message[0], self.handle(*message))
+                except OSError:
+                    return
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:  # closed
+                return
+            threading.Thread(
+                target=self.serve_connection, args=(conn,), daemon=True
+            ).start()
+
+    @property
+    def socket_path(self):
+        return str(Path(self.directory.name) / "ipc.sock")
+
+    def start(self):
+        """Listen, and point I3SOCK (and, with tools, PATH) to the fake"""
+        self.directory = tempfile.TemporaryDirectory(prefix="fake-i3-")
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(16)
+        threading.Thread(target=self.serve, daemon=True).start()
+        self.old_environ = {k: os.environ.get(k) for k in ("I3SOCK", "PATH")}
+        os.environ["I3SOCK"] = self.socket_path
+        if self.tools:
+            self.install_tools(self.directory.name)
+            os.environ["PATH"] = self.directory.name + os.pathsep + os.environ["PATH"]
+        return self
+
+    def stop(self):
+        for key, value in self.old_environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.server.close()
+        self.directory.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, message_type=RUN_COMMAND):
+        """How many requests of this type were received"""
+        with self.lock:
+            return sum(1 for t, _ in self.requests if t == message_type)
+
+    @property
+    def commands(self):
+        with self.lock:
+            return [p for t, p in self.requests if t == RUN_COMMAND]
+
+
+tool_script = f"""#!{sys.executable}
+# fake xdotool / xprop / notify-send - see i3_instant_layout.fakei3
+import json
+import os
+import socket
+import struct
+import sys
+
+argv = [os.path.basename(sys.argv[0])] + sys.argv[1:]
+payload = ({fork_prefix!r} + json.dumps(argv)).encode("utf-8")
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+sock.connect(os.environ["I3SOCK"])
+sock.sendall(struct.pack("=6sII", b"i3-ipc", len(payload), 0) + payload)
+data = b""
+while len(data) < 14:
+    data += sock.recv(14 - len(data))
+_, length, _ = struct.unpack("=6sII", data)
+reply = b""
+while len(reply) < length:
+    reply += sock.recv(length - len(reply))
+sys.exit(0 if json.loads(reply)[0]["success"] else 1)
+"""
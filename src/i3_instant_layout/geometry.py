@@ -0,0 +1,105 @@
+"""Where the windows end up - computed from the layout, without i3.
+
+rectangles() turns a layout's append_layout tree into (x, y, width, height)
+per placeholder, the way i3 sizes containers (percents fixed up like
+con_fix_percent, tabbed/stacked children share their parent's area).
+Title bars and gaps are ignored.
+
+window_rectangles() / batch_rectangles() map them to the windows
+(0 = the active one), honoring the layouts' remap orders.
+"""
+from .layouts import fix_percent, flatten
+
+
+def split(start, length, percents):
+    """Divide length into integer pieces - rounded at the boundaries,
+    so they add up exactly"""
+    result = []
+    covered = 0.0
+    position = start
+    for p in percents:
+        covered += p
+        end = start + int(round(covered * length))
+        result.append((position, end - position))
+        position = end
+    return result
+
+
+def rectangles(layout_dict, width, height, x=0, y=0, root_layout="splith"):
+    """[(x, y, width, height)] of the swallow placeholders, in the order
+    i3 fills them. root_layout is the layout of the container the
+    layout is appended to (matters if the layout is a list)."""
+    result = []
+
+    def place(n, x, y, width, height):
+        if "swallows" in n:
+            result.append((x, y, width, height))
+            return
+        place_children(n.get("layout"), n.get("nodes", []), x, y, width, height)
+
+    def place_children(layout, children, x, y, width, height):
+        children = flatten(children)
+        if not children:
+            return
+        percents = fix_percent([c.get("percent") for c in children])
+        if layout == "splith":
+            for c, (cx, cw) in zip(children, split(x, width, percents)):
+                place(c, cx, y, cw, height)
+        elif layout == "splitv":
+            for c, (cy, ch) in zip(children, split(y, height, percents)):
+                place(c, x, cy, width, ch)
+        else:  # tabbed, stacked: everybody gets it all
+            for c in children:
+                place(c, x, y, width, height)
+
+    place_children(root_layout, [layout_dict], x, y, width, height)
+    return result
+
+
+def window_rectangles(layout, window_count, width, height):
+    """[(x, y, width, height)] for window 0 (the active one) .. window_count - 1.
+
+    Raises whatever the layout raises for window counts it can't do.
+    """
+    import json
+    from . import cache
+
+    layout_json, remap_order, _ = cache.get_compiled(layout, window_count)
+    if layout_json is None:
+        return None
+    slots = rectangles(json.loads(layout_json), width, height)
+    if remap_order is None:
+        remap_order = range(window_count)
+    result = [None] * window_count
+    for slot, window in zip(slots, remap_order):
+        result[window] = slot
+    return result
+
+
+def batch_rectangles(layout, window_counts, width, height):
+    """{window_count: window_rectangles(...) or None if the layout can't}"""
+    result = {}
+    for window_count in window_counts:
+        try:
+            result[window_count] = window_rectangles(
+                layout, window_count, width, height
+            )
+        except Exception:  # layouts don't support every window count
+            result[window_count] = None
+    return result
+
+
+def to_array(batch):
+    """batch_rectangles() as a numpy array, (window counts, windows, 4),
+    padded with zeros (needs numpy, pip install i3-instant-layout[numpy])"""
+    import numpy
+
+    counts = sorted(batch)
+    result = numpy.zeros(
+        (len(counts), max(counts, default=0), 4), dtype=numpy.int32
+    )
+    for ii, window_count in enumerate(counts):
+        for jj, rect in enumerate(batch[window_count] or []):
+            if rect is not None:
+                result[ii, jj] = rect
+    return result
@@ -1,27 +1,233 @@
+import json
 import math
 
-layouts = []
+
+class LayoutRegistry:
+    """All known layouts, indexed by name and alias"""
+
+    def __init__(self):
+        self.layouts = []  # in registration order
+        self.by_name = {}  # name or alias -> layout class
+        self.by_lower_name = {}
+
+    def register(self, cls):
+        if " " in cls.name:
+            raise ValueError(
+                f"No spaces in layout names please. Offender: '{cls.name}'"
+            )
+        for alias in [cls.name] + cls.aliases:
+            if alias.lower() in self.by_lower_name:
+                raise ValueError(
+                    f"Layout name/alias '{alias}' of {cls.__name__} already used "
+                    f"by {self.by_lower_name[alias.lower()].__name__}"
+                )
+        for alias in [cls.name] + cls.aliases:
+            self.by_name[alias] = cls
+            self.by_lower_name[alias.lower()] = cls
+        self.layouts.append(cls)
+        return cls
+
+    def __iter__(self):
+        return iter(self.layouts)
+
+    def __len__(self):
+        return len(self.layouts)
+
+    def get(self, name):
+        """Exact name or alias lookup, None if unknown"""
+        return self.by_name.get(name)
+
+    def find(self, query):
+        """Lookup for the command line: exact, case insensitive, unique prefix,
+        or a single close (typo) match. None if there is no (unique) answer.
+        """
+        if query in self.by_name:
+            return self.by_name[query]
+        query = query.lower()
+        if query in self.by_lower_name:
+            return self.by_lower_name[query]
+        candidates = {
+            cls for name, cls in self.by_lower_name.items() if name.startswith(query)
+        }
+        if len(candidates) == 1:
+            return candidates.pop()
+        if not candidates:
+            import difflib
+
+            close = {
+                self.by_lower_name[x]
+                for x in difflib.get_close_matches(
+                    query, self.by_lower_name, n=2, cutoff=0.8
+                )
+            }
+            if len(close) == 1:
+                return close.pop()
+        return None
+
+
+registry = LayoutRegistry()
+layouts = registry.layouts
 
 
 def register_layout(cls):
-    layouts.append(cls)
-    return cls
+    return registry.register(cls)
+
+
+class Node:
+    """A container of a layout - what i3 gets as
+
+    {"border": "normal", "floating": "auto_off", "percent": ..., "type": "con",
+    "layout": ..., "swallows": ... (placeholders only), "nodes": [...]}
+
+    but without a dict per container. Turned into json by dump().
+    Supports n["key"], n.get("key") and "key" in n like the dict it stands for.
+    """
+
+    __slots__ = ("percent", "layout", "swallows", "nodes", "marks")
+
+    def __init__(self, percent, layout, swallows=False, nodes=None):
+        self.percent = percent
+        self.layout = layout
+        self.swallows = swallows
+        self.nodes = nodes
+        self.marks = None
+
+    def to_dict(self):
+        """The dict this stands for (children are left as they are)"""
+        result = {
+            "border": "normal",
+            "floating": "auto_off",
+            "percent": self.percent,
+            "type": "con",
+            "layout": self.layout,
+        }
+        if self.swallows:
+            result["swallows"] = [[{"class": "."}]]
+        if self.nodes is not None:
+            result["nodes"] = self.nodes
+        if self.marks is not None:
+            result["marks"] = self.marks
+        return result
+
+    def write(self, out):
+        out('{"border":"normal","floating":"auto_off","percent":')
+        # what json.dumps makes of ints and floats
+        out("null" if self.percent is None else repr(self.percent))
+        out(f',"type":"con","layout":"{self.layout}"')
+        if self.swallows:
+            out(',"swallows":[[{"class":"."}]]')
+        if self.nodes is not None:
+            out(',"nodes":')
+            write(self.nodes, out)
+        if self.marks is not None:
+            out(',"marks":')
+            out(json.dumps(self.marks, separators=(",", ":")))
+        out("}")
+
+    def __contains__(self, key):
+        return key in self.to_dict()
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+    def get(self, key, default=None):
+        return self.to_dict().get(key, default)
+
+    def __setitem__(self, key, value):
+        if key == "swallows":
+            value = bool(value)
+        elif key not in ("percent", "layout", "nodes", "marks"):
+            raise KeyError(key)
+        setattr(self, key, value)
+
+
+class Split(Node):
+    """A bare split container: {"layout": ..., "type": "con", "nodes": [...]}"""
+
+    __slots__ = ()
+
+    def __init__(self, layout, nodes):
+        Node.__init__(self, None, layout, False, nodes)
+
+    def to_dict(self):
+        result = {"layout": self.layout, "type": "con", "nodes": self.nodes}
+        if self.marks is not None:
+            result["marks"] = self.marks
+        return result
+
+    def write(self, out):
+        out(f'{{"layout":"{self.layout}","type":"con","nodes":')
+        write(self.nodes, out)
+        if self.marks is not None:
+            out(',"marks":')
+            out(json.dumps(self.marks, separators=(",", ":")))
+        out("}")
+
+    def __setitem__(self, key, value):
+        if key not in ("layout", "nodes", "marks"):
+            raise KeyError(key)
+        setattr(self, key, value)
+
+
+def write(tree, out):
+    """Stream the json of a layout tree (Nodes, lists, plain dicts) into out"""
+    if isinstance(tree, Node):
+        tree.write(out)
+    elif isinstance(tree, (list, tuple)):
+        out("[")
+        for ii, x in enumerate(tree):
+            if ii:
+                out(",")
+            write(x, out)
+        out("]")
+    elif isinstance(tree, dict):
+        out("{")
+        for ii, (key, value) in enumerate(tree.items()):
+            if ii:
+                out(",")
+            out(json.dumps(key))
+            out(":")
+            write(value, out)
+        out("}")
+    else:
+        out(json.dumps(tree))
+
+
+def dump(tree):
+    """The json i3 gets for a layout tree -
+    the same as json.dumps(tree, separators=(",", ":")) on the dicts"""
+    parts = []
+    write(tree, parts.append)
+    return "".join(parts)
 
 
 def node(percent, layout, swallows, children):
-    result = {
-        "border": "normal",
-        # "current_border_width": 2,
-        "floating": "auto_off",
-        # "name": "fish  <</home/finkernagel>>",
-        "percent": percent,
-        "type": "con",
-        "layout": layout,
-    }
-    if swallows:
-        result["swallows"] = ([{"class": "."}],)
-    if children:
-        result["nodes"] = children
+    return Node(percent, layout, swallows, children or None)
+
+
+def fix_percent(percents):
+    """What i3 makes of the children's percents (con_fix_percent):
+    missing ones (None / 0) are filled in proportional to the others,
+    then everything is normalized to sum up to 1."""
+    given = [p for p in percents if p and p > 0]
+    total = sum(given)
+    result = []
+    for p in percents:
+        if not p or p <= 0:
+            p = total / len(given) if given else 1.0
+            total += p
+        result.append(p)
+    return [p / total for p in result]
+
+
+def flatten(nodes):
+    """i3 treats nested lists in a layout as plain siblings"""
+    result = []
+    for n in nodes:
+        if isinstance(n, (list, tuple)):
+            result.extend(flatten(n))
+        else:
+            result.append(n)
     return result
 
 
@@ -33,7 +239,7 @@ def get_stack_unequal(percentages, split):
     elements = []
     for p in percentages:
         elements.append(node(p, split, True, False))
-    return [{"layout": split, "type": "con", "nodes": elements}]
+    return [Split(split, elements)]
 
 
 @register_layout
@@ -111,7 +317,7 @@ class Layout_v2Stack:
         s = int(math.ceil(window_count / 2))
         left = get_stack(s, "splitv")
         right = get_stack(s if window_count % 2 == 0 else s - 1, "splitv")
-        return [{"layout": "splith", "type": "con", "nodes": [left, right]}]
+        return [Split("splith", [left, right])]
 
 
 @register_layout
@@ -131,7 +337,7 @@ class Layout_h2Stack:
         s = int(math.ceil(window_count / 2))
         left = get_stack(s, "splith")
         right = get_stack(s if window_count % 2 == 0 else s - 1, "splith")
-        return [{"layout": "splitv", "type": "con", "nodes": [left, right]}]
+        return [Split("splitv", [left, right])]
 
 
 @register_layout
@@ -152,7 +358,7 @@ class Layout_v3Stack:
         a = get_stack(s + window_count % 3, "splitv")
         b = get_stack(s, "splitv")
         c = get_stack(s, "splitv")
-        return [{"layout": "splith", "type": "con", "nodes": [a, b, c]}]
+        return [Split("splith", [a, b, c])]
 
 
 @register_layout
@@ -175,7 +381,7 @@ class Layout_h3Stack:
         a = get_stack(s + window_count % 3, "splith")
         b = get_stack(s, "splith")
         c = get_stack(s, "splith")
-        return [{"layout": "splitv", "type": "con", "nodes": [a, b, c]}]
+        return [Split("splitv", [a, b, c])]
 
 
 @register_layout
@@ -417,21 +623,17 @@ class Nested:
 
     def get_json(self, window_count):
         dir = "h"
-        parent = node(1, "splith", False, [])
+        parent = Node(1, "splith", False, [])
         root = parent
-        parent["nodes"] = []
         for ii in range(window_count):
-            parent["nodes"].append(get_stack_unequal([0.5], "split" + dir))
-            n = node(1, "splith", False, [])
+            parent.nodes.append(get_stack_unequal([0.5], "split" + dir))
             if dir == "h":
                 dir = "v"
             else:
                 dir = "h"
-
-            n["layout"] = "split" + dir
-            n["nodes"] = []
+            n = Node(1, "split" + dir, False, [])
             if ii < window_count - 1:
-                parent["nodes"].append(n)
+                parent.nodes.append(n)
                 parent = n
         return root
 
@@ -751,7 +953,6 @@ class Layout_MainCenter:
         if right:
             nodes.append(node(0.25, "splith", False, get_stack(right, "splitv")))
         order = list(range(1, left + 1)) + [0] + list(range(left + 1, left + 1 + right))
-        print(order)
         return node(1, "splith", False, nodes), order
 
 
@@ -779,3 +980,19 @@ class Layout_MainTop:
             False,
             [node(0.5, "splith", True, []), get_stack(window_count - 1, "splith")],
         )
+
+
+@register_layout
+class Layout_Auto:
+    name = "auto"
+    aliases = ["best"]
+    description = """\
+            Picks the layout that suits the windows best:
+            every window gets at least its minimum size
+            (or a sane default) if possible, and the smallest window
+            is as large (and as little squashed) as possible.
+            See auto.py.
+            """
+
+    def get_json(self, window_count):
+        raise ValueError("auto is resolved to a layout when applying it")
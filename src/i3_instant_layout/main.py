@@ -1,162 +1,593 @@
-import asyncio
-import i3ipc
+# Keep the imports light - --list is on the critical path of the rofi menu.
+# i3ipc, subprocess, tempfile & co are imported where they are needed.
 import datetime
 import json
 import math
-import subprocess
+import os
 import sys
-import tempfile
 from pathlib import Path
-from . import layouts, __version__
+from . import layouts, timings, __version__
 
 
 counter_file = Path("~/.local/share/i3-instant-layout/counter.json").expanduser()
-counter_file.parent.mkdir(exist_ok=True, parents=True)
-
-
-def append_layout(layout_dict, window_count):
-    """Apply a layout from this layout class"""
-    tf = tempfile.NamedTemporaryFile(suffix=".json")
-    tf.write(json.dumps(layout_dict, indent=4).encode("utf-8"))
-    tf.flush()
-    cmd = ["i3-msg", "append_layout", str(Path(tf.name).absolute())]
-    subprocess.check_call(cmd, stdout=subprocess.PIPE)
-    tf.close()
-
-
-def nuke_swallow_windows():
-    """Remove swallow windows before changing layout"""
-    to_nuke = set()
-
-    def walk_tree(con):
-        if con.ipc_data.get("swallows", False):
-            to_nuke.add(con.ipc_data["window"])
-        for d in con.descendants():
-            walk_tree(d)
-
-    i3 = i3ipc.Connection()
-    tree = i3.get_tree().find_focused().workspace()
-    walk_tree(tree)
-    for window_id in to_nuke:
-        subprocess.check_call(["xdotool", "windowclose", str(window_id)])
-
-
-def get_window_ids():
-    """use xprop to list windows on current screen.
-
-    Couldn't find out how to get the right ids from i3ipc.
-    id is con_id, but we need x11 id
-
-    Sorry, this probably means this won't work on wayland & sway.
-    """
-
-    desktop = subprocess.check_output(
-        ["xprop", "-notype", "-root", "_NET_CURRENT_DESKTOP"]
-    ).decode("utf-8", errors="replace")
-    desktop = desktop[desktop.rfind("=") + 2 :].strip()
-    res = subprocess.check_output(
-        [
-            "xdotool",
-            "search",
-            "--all",
-            "--onlyvisible",
-            "--desktop",
-            desktop,
-            "--class",
-            "^.*",
-        ]
-    ).decode("utf-8", errors="replace")
-    return res.strip().split("\n")
-
-
-def get_active_window():
-    return (
-        subprocess.check_output(["xdotool", "getactivewindow"]).decode("utf-8").strip()
-    )
+ranked_file = counter_file.with_name("ranked.txt")
+journal_file = counter_file.with_name("usage.log")
+lock_file = counter_file.with_name("usage.lock")
+workspace_layouts_file = counter_file.with_name("workspaces.json")
+max_journal_size = 16 * 1024
+
+_i3 = None
+_usage = None  # kept in memory by the daemon
+_journal_size = 0  # how much of the journal _usage has seen
+
+
+def get_i3():
+    """One i3 connection per process"""
+    global _i3
+    if _i3 is None:
+        with timings.stage("ipc:connect"):
+            import i3ipc
+
+            _i3 = i3ipc.Connection(auto_reconnect=True)
+    return _i3
+
+
+def run(cmd):
+    """Run an external program (xdotool & co), raise if it fails"""
+    import subprocess
+
+    with timings.stage(f"fork:{cmd[0]}"):
+        subprocess.check_call(cmd)
+
+
+def spawn(cmd):
+    """Start an external program and don't wait for it.
+
+    Detached (own session, no stdio), and a missing program is no error.
+    """
+    import subprocess
+
+    with timings.stage(f"fork:{cmd[0]}"):
+        try:
+            subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except OSError:
+            pass
+
+
+def in_background(func, *args):
+    """Start func(*args) in a thread.
+
+    Returns a function that waits for it and returns its result (or raises).
+    """
+    import threading
+
+    result = {}
+
+    def target():
+        try:
+            result["value"] = func(*args)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+
+    def wait():
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    return wait
+
+
+def i3_command(cmd):
+    """Send one i3 command (list), raise if any part failed"""
+    i3 = get_i3()
+    with timings.stage("ipc:command"):
+        replies = i3.command(cmd)
+    for reply in replies:
+        if not reply.success:
+            raise ValueError(f"i3 command failed: {reply.error} ({cmd})")
+
+
+def layout_file_dir():
+    """Somewhere memory backed to hand i3 the layout file"""
+    for candidate in ["/dev/shm", os.environ.get("XDG_RUNTIME_DIR")]:
+        if candidate and os.access(candidate, os.W_OK):
+            return candidate
+    return None  # tempfile's default
+
+
+def append_layout(layout_json, window_count, then=(), before=()):
+    """Apply a layout from this layout class.
+
+    i3 only takes append_layout from a file, so the (compact) json is written to
+    a memory backed one and sent over the existing i3 connection,
+    between the commands in 'before' and 'then', all in one message.
+    """
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(suffix=".json", dir=layout_file_dir()) as tf:
+        tf.write(layout_json.encode("utf-8"))
+        tf.flush()
+        i3_command(
+            "; ".join(list(before) + [f'append_layout "{tf.name}"'] + list(then))
+        )
+
+
+def get_workspace():
+    """The focused workspace's tree. The only IPC query needed for an apply"""
+    i3 = get_i3()
+    with timings.stage("ipc:get_tree"):
+        tree = i3.get_tree()
+    return tree.find_focused().workspace()
+
+
+def walk_tree(con):
+    """con and everything below it, depth first (= on-screen order),
+    a container's floating children after its tiled ones.
+
+    Visits every container once.
+    """
+    todo = [con]
+    while todo:
+        con = todo.pop()
+        yield con
+        todo.extend(reversed(con.floating_nodes))
+        todo.extend(reversed(con.nodes))
+
+
+def swallow_placeholders(workspace):
+    """con_ids of the swallow windows (placeholders) on this workspace"""
+    return [con.id for con in walk_tree(workspace) if con.ipc_data.get("swallows")]
+
+
+def kill_cons(con_ids):
+    """Close these containers - all in one i3 command"""
+    if con_ids:
+        i3_command("; ".join(f"[con_id={con_id}] kill" for con_id in con_ids))
+
+
+def nuke_swallow_windows(workspace):
+    """Remove swallow windows before changing layout - all in one i3 command"""
+    kill_cons(swallow_placeholders(workspace))
+
+
+def iter_windows(workspace):
+    """Window containers in on-screen order, floating ones last.
+
+    Swallow placeholders are skipped.
+    """
+    for con in walk_tree(workspace):
+        if con.window and not con.ipc_data.get("swallows"):
+            yield con
+
+
+def get_window_ids(workspace):
+    """X11 ids of the windows on this workspace, in on-screen order"""
+    return [con.window for con in iter_windows(workspace)]
+
+
+def get_active_con(workspace):
+    """The focused container - or, on a workspace without the focus,
+    the one that gets it when you switch there."""
+    con = workspace.find_focused()
+    if con is None:  # follow the workspace's focus stack
+        con = workspace
+        while con.ipc_data.get("focus"):
+            focus_id = con.ipc_data["focus"][0]
+            children = con.nodes + con.floating_nodes
+            con = next((x for x in children if x.id == focus_id), None)
+            if con is None:
+                return None
+    return con
+
+
+def get_active_window(workspace):
+    """X11 id of the active window (see get_active_con).
+
+    None if the focus is not on a window.
+    """
+    con = get_active_con(workspace)
+    return None if con is None else con.window
 
 
 def focus_window(id):
-    return subprocess.check_call(
-        ["i3-msg", f'[id="{id}"]', "focus"], stdout=subprocess.PIPE
-    )
-    # return subprocess.check_call(['xdotool','windowraise', id])
+    i3_command(f'[id="{id}"] focus')
+
+
+mark_prefix = "_instant_layout_"
 
 
-def apply_layout(layout, dry_run=False):
-    """Actually turn this workspace into this layout"""
-    active = get_active_window()
-    windows = get_window_ids()
-    windows = [active] + [x for x in windows if x != active]
+def mark_swallow_nodes(layout_dict):
+    """Give every swallow placeholder a mark, in the order i3 fills them.
+
+    Returns the marks.
+    """
+    marks = []
+    todo = [layout_dict]
+    while todo:
+        n = todo.pop()
+        if isinstance(n, (list, tuple)):
+            todo.extend(reversed(n))
+        elif isinstance(n, layouts.Node):  # its slots - no dict needed
+            if n.swallows:
+                n.marks = [f"{mark_prefix}{len(marks)}"]
+                marks.append(n.marks[0])
+            todo.extend(reversed(n.nodes or []))
+        elif isinstance(n, dict):  # layouts that build plain dicts
+            if "swallows" in n:
+                n["marks"] = [f"{mark_prefix}{len(marks)}"]
+                marks.append(n["marks"][0])
+            todo.extend(reversed(n.get("nodes", [])))
+    return marks
+
+
+def swap_into_placeholders(windows, marks, active):
+    """i3 commands to move the windows into the marked placeholders.
+
+    The placeholders end up where the windows were and are killed,
+    unused ones are unmarked and stay, just like in swallow mode.
+    """
+    cmd = []
+    for window_id, mark in zip(windows, marks):
+        cmd.append(f'[id="{window_id}"] swap container with mark {mark}')
+    used = "|".join(str(ii) for ii in range(min(len(windows), len(marks))))
+    if used:
+        cmd.append(f'[con_mark="^{mark_prefix}({used})$"] kill')
+    for mark in marks[len(windows) :]:
+        cmd.append(f"unmark {mark}")
+    if active is not None:
+        cmd.append(f'[id="{active}"] focus')
+    return cmd
+
+
+def adjust_commands(
+    workspace, layout_json, windows, active, restore_focus=None, backend=None
+):
+    """i3 commands that turn the workspace into the layout by swapping,
+    re-splitting and resizing only what differs ([] if it already is).
+    None if the structure is too different for that."""
+    from . import backends, diff
+
+    backend = backend or backends.get()
+    with timings.stage("diff"):
+        commands = diff.plan(workspace, json.loads(layout_json), windows, backend.ids)
+    if commands:
+        if active is not None:
+            commands.append(f"{backend.criteria(active)} focus")
+        if restore_focus is not None:
+            commands.append(f"{restore_focus} focus")
+    return commands
+
+
+def plan_layout(
+    layout, workspace, swap=False, adjust=True, restore_focus=None, backend=None
+):
+    """What apply_layout does to the workspace, without doing it.
+
+    A dict that survives json (see prepared.py): the backend's name,
+    the layout_json (None: the layout declined), the adjust commands
+    (None: the backend builds it) and what the backend needs for that.
+    None if there is nothing to do.
+    """
+    from . import backends, cache
+
+    backend = backends.get(backend, swap)
+    with timings.stage("get_window_ids"):
+        active = backend.active_window(workspace)
+        windows = backend.window_ids(workspace)
+        if active in windows:
+            windows = [active] + [x for x in windows if x != active]
     window_count = len(windows)
-    # we unmap and map all at once for speed.
-    unmap_cmd = [
-        "xdotool",
-    ]
-    map_cmd = [
-        "xdotool",
-    ]
-    t = layout.get_json(window_count)
-    if isinstance(t, tuple):
-        layout_dict, remap_order = t
+    if isinstance(layout, layouts.Layout_Auto):
+        from . import auto
+
+        with timings.stage("auto"):
+            layout = auto.pick(workspace, backend.x11_ids(workspace, windows))()
+    visit, leave = [], []
+    if restore_focus is not None:
+        if not windows:  # nothing to lay out, and nothing to focus it by
+            return None
+        if isinstance(backend, backends.Swallow):
+            # hidden windows are unmapped, xdotool can't get them swallowed
+            backend = backends.Swap()
+        visit = [f"{backend.criteria(windows[0])} focus"]
+        leave = [f"{restore_focus} focus"]
+    with timings.stage("get_json"):
+        layout_json, remap_order, marks = cache.get_compiled(
+            layout, window_count, backend.marked
+        )
+    if remap_order is not None:
         if set(range(window_count)) != set(remap_order):
             raise ValueError("Layout returned invalid remap order")
         windows = [windows[ii] for ii in remap_order]
-    else:
-        layout_dict = t
+    return compiled_plan(
+        workspace,
+        backend,
+        layout.name,
+        layout_json,
+        windows,
+        marks,
+        active,
+        adjust,
+        restore_focus,
+        visit,
+        leave,
+    )
+
+
+def compiled_plan(
+    workspace,
+    backend,
+    name,
+    layout_json,
+    windows,
+    marks,
+    active,
+    adjust=True,
+    restore_focus=None,
+    visit=(),
+    leave=(),
+):
+    """plan_layout() for a layout that's already json (named name),
+    windows in the order they fill it"""
+    commands = None
+    if adjust and layout_json is not None:
+        commands = adjust_commands(
+            workspace, layout_json, windows, active, restore_focus, backend
+        )
+    return {
+        "backend": backend.name,
+        "layout": name,
+        "layout_json": layout_json,
+        "commands": commands,
+        "windows": windows,
+        "marks": marks,
+        "active": active,
+        "visit": list(visit),
+        "leave": list(leave),
+    }
+
+
+def execute_plan(plan):
+    """Do what plan_layout planned"""
+    from . import backends
 
+    if plan is None or plan["layout_json"] is None:
+        return  # nothing to lay out, or the layout declined
+    if plan["commands"] is not None:
+        # already (nearly) there - only the differences are changed
+        if plan["commands"]:
+            with timings.stage("adjust"):
+                i3_command("; ".join(plan["commands"]))
+        return
+    backends.get(plan["backend"]).apply(
+        plan["layout_json"],
+        plan["windows"],
+        plan["marks"],
+        plan["active"],
+        plan["visit"],
+        plan["leave"],
+    )
+
+
+def apply_layout(
+    layout,
+    workspace,
+    dry_run=False,
+    swap=False,
+    adjust=True,
+    restore_focus=None,
+    backend=None,
+):
+    """Actually turn this workspace into this layout.
+
+    If the workspace already has the layout's structure, only the differences
+    are changed (see diff.py, unless adjust=False). Otherwise the backend
+    (see backends.py, by name, default depends on swap and the window manager)
+    builds it: windows unmapped and mapped with xdotool so i3 swallows them,
+    with swap=True swapped into marked placeholders instead - no unmapping
+    (and no redraw), and just one i3 command - or, on sway, moved into place
+    with plain IPC commands.
+
+    For a workspace that does not have the focus, pass the i3 criteria of the
+    focused container as restore_focus (see focus_criteria). We then focus the
+    workspace only for the duration of the (single) i3 command, so it never
+    becomes visible.
+    """
     if dry_run:
-        print(json.dumps(layout_dict, indent=4))
+        adjust = False
+    plan = plan_layout(layout, workspace, swap, adjust, restore_focus, backend)
+    if dry_run:
+        if plan is not None:
+            print(json.dumps(json.loads(plan["layout_json"] or "false"), indent=4))
     else:
-        if layout_dict is not False:
-            append_layout(layout_dict, window_count)
-            for window_id in windows:
-                unmap_cmd.append("windowunmap")
-                map_cmd.append("windowmap")
-                unmap_cmd.append(str(window_id))
-                map_cmd.append(str(window_id))
+        execute_plan(plan)
 
-            # force i3 to swallow these windows.
-            subprocess.check_call(unmap_cmd)
-            subprocess.check_call(map_cmd)
-            focus_window(active)
 
+def remember_state(workspace, swap=False, backend=None):
+    """Put the workspace's current state on its undo ring (see snapshots.py)"""
+    from . import backends, snapshots
 
-def load_usage():
+    snapshots.push_undo(
+        workspace.name, snapshots.take(workspace, backends.get(backend, swap).ids)
+    )
+
+
+def keep_usage_warm():
+    """Keep the usage counters in memory from now on (daemon mode)"""
+    global _usage, _journal_size
+    _usage, _journal_size = read_usage()
+
+
+def write_atomically(path, text):
+    """Replace path's content - readers see the old or the new version, never half"""
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, suffix=".tmp", delete=False
+    ) as op:
+        op.write(text)
+    os.replace(op.name, path)
+
+
+def load_workspace_layouts():
+    """{workspace name: name of the layout last applied there}"""
     try:
-        with open(counter_file, "r") as op:
+        with open(workspace_layouts_file, "r") as op:
             return json.load(op)
     except (OSError, ValueError):
         return {}
 
 
+def remember_layout(workspace_name, layout_name):
+    """Note the layout of a workspace, for --watch"""
+    remembered = load_workspace_layouts()
+    if remembered.get(workspace_name) != layout_name:
+        remembered[workspace_name] = layout_name
+        counter_file.parent.mkdir(exist_ok=True, parents=True)
+        write_atomically(workspace_layouts_file, json.dumps(remembered))
+
+
+def read_journal(usage, folded=None):
+    """Replay the usage journal on top of usage (in place).
+
+    folded is (inode, size) of the journal the snapshot already
+    contains that much of (see compact_usage) - that part is skipped.
+    Returns the size of the journal read.
+    """
+    try:
+        with open(journal_file, "rb") as op:
+            inode = os.fstat(op.fileno()).st_ino
+            data = op.read()
+    except OSError:
+        return 0
+    skip = folded[1] if folded and folded[0] == inode else 0
+    for line in data[skip:].decode("utf-8", "replace").splitlines():
+        try:
+            layout_name, timestamp = line.split("\t")
+            timestamp = float(timestamp)
+        except ValueError:  # a torn line - skip it, keep the rest
+            continue
+        count = usage.get(layout_name, (0, timestamp))[0]
+        usage[layout_name] = (count + 1, timestamp)
+    return len(data)
+
+
+def read_usage():
+    """(usage, size of the journal read) from disk - see load_usage"""
+    try:
+        with open(counter_file, "r") as op:
+            usage = json.load(op)
+    except OSError:
+        usage = {}
+    except ValueError:
+        # keep the evidence, but don't throw away the journal as well.
+        aside = counter_file.with_suffix(".json.corrupt")
+        print(f"Usage snapshot was corrupt, moved to {aside}", file=sys.stderr)
+        try:
+            os.replace(counter_file, aside)
+        except OSError:  # someone else beat us to it
+            pass
+        usage = {}
+    folded = usage.pop("_journal", None)
+    return usage, read_journal(usage, folded)
+
+
+def load_usage():
+    """{layout_name: (use count, last used timestamp)}.
+
+    That's the last snapshot (counter.json) plus the journal since.
+    """
+    if _usage is not None:
+        return _usage
+    return read_usage()[0]
+
+
+def compact_usage():
+    """Fold the journal into the snapshot, returns the usage.
+
+    Reads both from disk (the journal has lines of other instances, too)
+    and holds the exclusive lock, so no appends are lost.
+    The snapshot notes which journal (inode) it contains how much of,
+    and the journal is replaced by a new (empty) file - a crash in between
+    doesn't count those uses twice.
+    """
+    import fcntl
+
+    global _usage, _journal_size
+    with open(lock_file, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        usage = read_usage()[0]
+        snapshot = dict(usage)
+        try:
+            journal = os.stat(journal_file)
+            snapshot["_journal"] = (journal.st_ino, journal.st_size)
+        except OSError:
+            pass
+        write_atomically(counter_file, json.dumps(snapshot))
+        write_atomically(journal_file, "")
+    if _usage is not None:
+        _usage, _journal_size = usage, 0
+    return usage
+
+
 def count_usage(layout_name):
-    usage = load_usage()
-    if layout_name not in usage:
-        usage[layout_name] = (0, datetime.datetime.now().timestamp())
-    usage[layout_name] = (
-        usage[layout_name][0] + 1,
-        datetime.datetime.now().timestamp(),
-    )
+    """Record one use of layout_name.
+
+    Appends one line to the journal (O(1), atomic - and safe with
+    several instances running at once), compacting it once it grows.
+    The daemon counts in memory, unless another instance wrote
+    to the journal since - then it reads it again.
+    """
+    import fcntl
 
-    with open(counter_file, "w") as op:
-        json.dump(usage, op)
+    global _usage, _journal_size
+    now = datetime.datetime.now().timestamp()
+    line = f"{layout_name}\t{now}\n".encode("utf-8")
+    counter_file.parent.mkdir(exist_ok=True, parents=True)
+    with open(lock_file, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        fd = os.open(journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            journal_size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    if journal_size > max_journal_size:
+        usage = compact_usage()
+    elif _usage is not None and journal_size == _journal_size + len(line):
+        _usage[layout_name] = (_usage.get(layout_name, (0, now))[0] + 1, now)
+        _journal_size = journal_size
+        usage = _usage
+    else:
+        usage, size = read_usage()
+        if _usage is not None:
+            _usage, _journal_size = usage, size
+    store_smart_order(usage)
 
 
-def list_layouts_in_smart_order():
-    """List the layouts in a 'smart' order,
+def smart_order(usage):
+    """The layouts (and aliases) in a 'smart' order,
     that means most common ones on top (by log10 usage),
     within one log10 unit, sorted by most-recently-used"""
-    usage = load_usage()
     sort_me = []
-    for layout in layouts.layouts:
-        if " " in layout.name:
-            raise ValueError(
-                f"No spaces in layout names please. Offender: '{layout.name}'"
-            )
+    for layout in layouts.registry:
         for alias in [layout.name] + layout.aliases:
-            usage_count, last_used = usage.get(
-                alias, (0, datetime.datetime.now().timestamp())
-            )
+            unused = (0, datetime.datetime.now().timestamp())
+            if layout is layouts.Layout_Auto:
+                # registered last, that would put it on top of the unused ones
+                # (and make it the menu's default) - it goes to their bottom
+                unused = (0, 0.0)
+            usage_count, last_used = usage.get(alias, unused)
             if alias == layout.name:
                 desc = alias
             else:
@@ -165,8 +596,38 @@ def list_layouts_in_smart_order():
                 (-1 * math.ceil(math.log10(usage_count + 1)), -1 * last_used, desc)
             )
     sort_me.sort()
-    for _, _, name in sort_me:
-        print(name)
+    return [name for _, _, name in sort_me]
+
+
+def store_smart_order(usage):
+    """Write the --list output next to the usage counter, returns it"""
+    text = "".join(name + "\n" for name in smart_order(usage))
+    try:
+        ranked_file.parent.mkdir(exist_ok=True, parents=True)
+        write_atomically(ranked_file, text)
+    except OSError:
+        pass
+    return text
+
+
+def list_layouts_in_smart_order():
+    """Print the layouts in smart_order().
+
+    The list is precomputed whenever a layout is used,
+    we only recompute it if it's missing or older than the layout definitions.
+    """
+    try:
+        if os.stat(ranked_file).st_mtime_ns >= os.stat(layouts.__file__).st_mtime_ns:
+            with open(ranked_file, "r") as op:
+                text = op.read()
+        else:
+            text = None
+    except OSError:
+        text = None
+    if not text:
+        text = store_smart_order(load_usage())
+    sys.stdout.write(text)
+    return text
 
 
 def print_help():
@@ -175,19 +636,54 @@ def print_help():
     based on the numerical position of the windows.
 
     Call with '--list' to get a list of available layouts (and their aliases).
+    Piped into a menu, it then prepares the top layouts for the focused workspace,
+    so a '-' right after (within 30s) applies the choice without asking i3 first.
+    Add --swap / --backend=NAME to --list as well, if you use them with '-'.
 
     Call with --desc to get detailed information about every layout available.
 
     Call with the name of a layout to apply it to the current workspace.
+    Unique prefixes ('mainL') and small typos work as well.
 
     Call with '-' to read layout name from stdin.
 
+    Call with 'name --swap' to swap the windows into place with one i3 command
+    instead of unmapping and mapping them (no flicker, keeps border styles).
+
+    Call with 'name --backend=ipc' to build the layout with i3 IPC commands only -
+    no xdotool, no append_layout, works on sway (the default there).
+    The other backends are 'swallow' (the default on i3) and 'swap' (same as --swap).
+
     Call with 'name --dry-run' to inspect the generated i3 append_layout compatible json.
 
     Call with --notification + the name of a layout to apply the layout and show a notification that displays the name of the applied layout
 
+    Call with '--bench [output.json]' to time layout generation and the apply pipeline
+    (against a fake i3) and write the results as json.
+
+    Call with 'name --timings' to get a breakdown of where the time went on stderr
+    (or set I3_INSTANT_LAYOUT_TIMINGS to a file to collect them as json lines).
+    Call with 'name --stats' to see how many programs were run and i3 messages sent.
+
+    Call with '--save NAME' to remember the arrangement of the current workspace,
+    and '--restore NAME' to get it back (windows closed since are left out).
+    Call with '--undo' to go back to how the workspace was before the last layout
+    (or restore) - up to 10 steps.
+
+    Call with '--workspace 2 mainLeft' to lay out another workspace without switching to it.
+    Repeat it, or use '--batch 1=mainLeft,2=matrix', to lay out several at once.
+
+    Call with --daemon to keep a server running that applies layouts without the python startup cost.
+    Call with '--client name' (or '--client -' to read from stdin) to have it apply a layout
+    (falls back to applying it directly if no daemon is running).
+
+    Call with --watch (or '--daemon --watch') to keep workspaces in the layout last applied to them
+    while windows open and close.
+
     To integrate into i3, add this to your i3/config.
         bindsym $mod+Escape exec "i3-instant-layout --list | rofi -dmenu -i | i3-instant-layout -"
+    or, with 'exec i3-instant-layout --daemon' in your config,
+        bindsym $mod+Escape exec "i3-instant-layout --list | rofi -dmenu -i | i3-instant-layout --client -"
 
     """
     )
@@ -206,8 +702,263 @@ def print_desc():
         print("")
 
 
+def find_layout(query):
+    """Layout class by name, alias or unique prefix, None if unknown"""
+    return layouts.registry.find(query)
+
+
+def timed_get_workspace():
+    with timings.stage("get_workspace"):
+        return get_workspace()
+
+
+def timed_count_usage(layout_name):
+    with timings.stage("count_usage"):
+        count_usage(layout_name)
+
+
+def focus_criteria(con):
+    """i3 criteria for con - by X11 id if it's a window, those survive
+    being swallowed into a new container"""
+    if con.window:
+        return f'[id="{con.window}"]'
+    return f"[con_id={con.id}]"
+
+
+def apply_to_workspaces(
+    assignments, swap=False, tree=None, backend=None, undo=True
+):
+    """Apply several layouts, [(workspace name, layout query)], with one tree query.
+
+    The visible workspace does not change - it's laid out last, the swallow
+    backend gives its windows new containers. Returns the names of the
+    workspaces that could not be laid out (unknown workspace or layout).
+    With undo, their states go on their undo rings first.
+    """
+    timings.reset()
+    if tree is None:
+        i3 = get_i3()
+        with timings.stage("ipc:get_tree"):
+            tree = i3.get_tree()
+    focused = tree.find_focused()
+    focused_workspace = focused.workspace()
+    workspaces = {ws.name: ws for ws in tree.workspaces()}
+    failed = []
+    restore_focus = focus_criteria(focused)
+    for name, query in sorted(
+        assignments,
+        key=lambda x: getattr(workspaces.get(x[0]), "id", None) == focused_workspace.id,
+    ):
+        layout_class = find_layout(query)
+        workspace = workspaces.get(name)
+        if layout_class is None or workspace is None:
+            failed.append(name)
+            continue
+        with timings.stage(f"workspace {name}"):
+            if undo:
+                remember_state(workspace, swap, backend)
+            nuke_swallow_windows(workspace)
+            if workspace.id == focused_workspace.id:
+                apply_layout(layout_class(), workspace, swap=swap, backend=backend)
+            else:
+                apply_layout(
+                    layout_class(),
+                    workspace,
+                    restore_focus=restore_focus,
+                    backend=backend,
+                )
+            remember_layout(name, layout_class.name)
+    timings.report(assignments=assignments, swap=swap)
+    return failed
+
+
+def parse_assignments(args):
+    """--workspace name layout and --batch name=layout,name=layout
+    into [(workspace name, layout query)] - other --flags are skipped.
+    Raises ValueError for anything malformed."""
+    assignments = []
+    options = ("--workspace", "--batch")
+    args = [x for x in args if x in options or not x.startswith("--")]
+    while args:
+        arg = args.pop(0)
+        if arg == "--workspace":
+            if len(args) < 2 or args[0] in options or args[1] in options:
+                raise ValueError("Expected --workspace NAME LAYOUT")
+            assignments.append((args.pop(0), args.pop(0)))
+        elif arg == "--batch":
+            if not args or args[0] in options:
+                raise ValueError("Expected --batch NAME=LAYOUT,NAME=LAYOUT")
+            for pair in args.pop(0).split(","):
+                name, _, query = pair.partition("=")
+                if not name.strip() or not query.strip():
+                    raise ValueError(f"Expected workspace=layout, got '{pair}'")
+                assignments.append((name.strip(), query.strip()))
+        else:
+            raise ValueError(f"Unexpected '{arg}'")
+    return assignments
+
+
+def backend_flag(args):
+    """NAME from a --backend=NAME argument, None if there is none"""
+    for arg in args:
+        if arg.startswith("--backend="):
+            return arg[len("--backend=") :]
+    return None
+
+
+def apply_named(
+    query,
+    dry_run=False,
+    show_notification=False,
+    swap=False,
+    backend=None,
+    use_prepared=False,
+):
+    """Apply the layout called query to the current workspace.
+
+    With use_prepared, what --list prepared (see prepared.py) is used if it can be.
+    Returns the layout's name, or None if there is no such layout.
+    """
+    if " " in query:
+        query = query[: query.find(" ")]
+    timings.reset()
+    layout_class = find_layout(query)
+    if layout_class is None:  # no need to ask i3 anything
+        return None
+    taken = pending_workspace = None
+    if use_prepared and not dry_run:
+        from . import prepared
+
+        with timings.stage("take_prepared"):
+            taken = prepared.take(layout_class.name, swap, backend)
+    if taken is None:
+        # the i3 round trip (and connecting, on the first call) overlaps
+        # with the imports
+        pending_workspace = in_background(timed_get_workspace)
+    # partial or misspelled queries count for the layout's name
+    if layouts.registry.get(query) is not layout_class:
+        query = layout_class.name
+    pending_undo = None
+    try:
+        if taken is not None:
+            workspace_name, to_nuke, plan, state = taken
+            from . import snapshots
+
+            pending_undo = in_background(snapshots.push_undo, workspace_name, state)
+            try:
+                with timings.stage("nuke_swallow_windows"):
+                    kill_cons(to_nuke)
+                with timings.stage("apply_layout"):
+                    execute_plan(plan)
+            except Exception:  # a window closed since it was planned, ...
+                pending_workspace = in_background(timed_get_workspace)
+        if pending_workspace is not None:
+            from . import cache  # noqa: F401 - imported while we wait
+
+            workspace = pending_workspace()
+            workspace_name = workspace.name
+            if not dry_run and taken is None:  # else it's on the ring already
+                pending_undo = in_background(remember_state, workspace, swap, backend)
+            with timings.stage("nuke_swallow_windows"):
+                nuke_swallow_windows(workspace)
+            with timings.stage("apply_layout"):
+                apply_layout(layout_class(), workspace, dry_run, swap, backend=backend)
+    finally:
+        if pending_undo is not None:
+            pending_undo()  # not to be cut off mid-write if the apply failed
+    # only a layout that was applied counts
+    pending_usage = in_background(timed_count_usage, query)
+    if not dry_run:
+        remember_layout(workspace_name, layout_class.name)
+    if show_notification:
+        with timings.stage("notification"):
+            spawn(["notify-send", "-t", "2000", "Applied layout", layout_class.name])
+    pending_usage()
+    timings.report(
+        layout=layout_class.name,
+        swap=swap,
+        backend=backend,
+        prepared=taken is not None and pending_workspace is None,
+    )
+    return layout_class.name
+
+
+def list_command(args):
+    """--list: the layouts for the menu, then prepare the top ones
+    while the user picks (if stdout is not a terminal)"""
+    menu = not sys.stdout.isatty()
+    if menu:
+        from . import prepared
+
+        prepared.reserve()
+    text = list_layouts_in_smart_order()
+    if menu:  # get ready while the user picks
+        sys.stdout.close()
+        try:
+            prepared.prepare(text.splitlines(), "--swap" in args, backend_flag(args))
+        except Exception:  # no i3, ... - '-' does it the normal way then
+            pass
+    return 0
+
+
+def workspaces_command(args):
+    """--workspace name layout / --batch name=layout,..., returns the exit code"""
+    try:
+        assignments = parse_assignments(args)
+    except ValueError as e:
+        print(e)
+        return 1
+    failed = apply_to_workspaces(
+        assignments,
+        swap="--swap" in args,
+        backend=backend_flag(args),
+    )
+    for name in failed:
+        print(f"Could not lay out workspace '{name}'")
+    return 1 if failed else 0
+
+
+def snapshot_command(args):
+    """--save NAME, --restore NAME and --undo, returns the exit code"""
+    from . import snapshots
+
+    swap = "--swap" in args
+    backend = backend_flag(args)
+    if args[0] == "--undo":
+        if not snapshots.undo(swap, backend):
+            print("Nothing to undo")
+            return 1
+        return 0
+    if len(args) < 2:
+        print(f"{args[0]} needs the name of a snapshot")
+        return 1
+    if args[0] == "--save":
+        from . import backends
+
+        snapshot = snapshots.take(get_workspace(), backends.get(backend, swap).ids)
+        if snapshot is None:
+            print("No windows to save")
+            return 1
+        snapshots.save(args[1], snapshot)
+        return 0
+    snapshot = snapshots.saved(args[1])
+    if snapshot is None:
+        print(f"No snapshot named '{args[1]}'")
+        return 1
+    snapshots.restore(snapshot, swap, backend)
+    return 0
+
+
 def main():
     showNotification = False
+    use_prepared = False
+    if "--timings" in sys.argv:
+        sys.argv.remove("--timings")
+        if timings.target is None:
+            timings.enable()
+    if "--stats" in sys.argv:
+        sys.argv.remove("--stats")
+        timings.show_stats = True
     if len(sys.argv) == 1 or sys.argv[1] == "--help":
         print_help()
     elif sys.argv[1] == "--desc":
@@ -217,29 +968,62 @@ def main():
         print(__version__)
         sys.exit(0)
     elif sys.argv[1] == "--list":
-        list_layouts_in_smart_order()
+        sys.exit(list_command(sys.argv))
+    elif sys.argv[1] == "--bench":
+        from . import bench
+
+        bench.main(sys.argv[2:])
         sys.exit(0)
+    elif sys.argv[1] == "--daemon":
+        from . import daemon
+
+        daemon.serve(
+            watch_too="--watch" in sys.argv,
+            swap="--swap" in sys.argv,
+            backend=backend_flag(sys.argv),
+        )
+        sys.exit(0)
+    elif sys.argv[1] in ("--workspace", "--batch"):
+        sys.exit(workspaces_command(sys.argv[1:]))
+    elif sys.argv[1] in ("--save", "--restore", "--undo"):
+        sys.exit(snapshot_command(sys.argv[1:]))
+    elif sys.argv[1] == "--watch":
+        from . import watch
+
+        watch.watch(swap="--swap" in sys.argv, backend=backend_flag(sys.argv))
+        sys.exit(0)
+    elif sys.argv[1] == "--client":
+        from . import daemon
+
+        words, flags = daemon.split_request(" ".join(sys.argv[2:]))
+        if words == ["-"]:
+            words = [sys.stdin.readline().strip()]
+        if not "".join(words).strip():  # e.g. rofi cancel
+            sys.exit(0)
+        query = " ".join(words[:1] + flags)
+        sys.exit(0 if daemon.client(query) else 1)
     elif sys.argv[1] == "-":
         query = sys.stdin.readline().strip()
         print(f'query "{query}"')
         if not query.strip():  # e.g. rofi cancel
             sys.exit(0)
+        use_prepared = True
     else:
         if sys.argv[1] == "--notification":
             showNotification = True
             query = sys.argv[2]
         else:
             query = sys.argv[1]
-    if " " in query:
-        query = query[: query.find(" ")]
-    for layout_class in layouts.layouts:
-        if query == layout_class.name or query in layout_class.aliases:
-            nuke_swallow_windows()
-            apply_layout(layout_class(), "--dry-run" in sys.argv)
-            if showNotification:
-                subprocess.check_call(["notify-send", "-t", "2000", "Applied layout", layout_class.name])
-            count_usage(query)
-            sys.exit(0)
+    applied = apply_named(
+        query,
+        "--dry-run" in sys.argv,
+        showNotification,
+        "--swap" in sys.argv,
+        backend_flag(sys.argv),
+        use_prepared,
+    )
+    if applied is not None:
+        sys.exit(0)
     else:
         print("Could not find the requested layout")
         sys.exit(1)
@@ -0,0 +1,125 @@
+"""Get the likely layouts ready while the menu is open.
+
+    i3-instant-layout --list | rofi -dmenu -i | i3-instant-layout -
+
+The user takes a second or more to pick a layout. Once --list has written
+the names (and closed stdout, so the menu has them all), it snapshots the
+focused workspace and plans (see main.plan_layout) the top ranked layouts
+for it into prepared_file. The '-' that follows then only reads the name
+and sends the prepared commands - no tree query, no layout generation.
+
+A prepared file is used once, and only if it's fresher than max_age
+and was made for the same backend. --list leaves a pending one before it
+writes the names: a pick that beats prepare() takes that, and prepare()
+then doesn't write plans of a tree that's gone by then. If a prepared
+command fails anyway (a window closed meanwhile), '-' does it the normal way.
+
+Its commands go straight to i3, so it lives in a per-user directory
+(XDG_RUNTIME_DIR, or next to the usage counter - never a shared /tmp),
+and is only trusted if it's ours and nobody else could have written it.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from .main import counter_file
+
+
+if os.environ.get("XDG_RUNTIME_DIR"):
+    prepared_file = Path(os.environ["XDG_RUNTIME_DIR"]) / "i3-instant-layout-plans.json"
+else:
+    prepared_file = counter_file.with_name("prepared.json")
+prepare_count = 5  # that many layouts from the top of --list
+max_age = 30  # seconds
+
+
+def top_layouts(lines, count=prepare_count):
+    """The first count layout classes named in --list output"""
+    from . import main
+
+    result = []
+    for line in lines:
+        layout_class = main.find_layout(line.split(" ")[0]) if line else None
+        if layout_class is not None and layout_class not in result:
+            result.append(layout_class)
+            if len(result) == count:
+                break
+    return result
+
+
+def prepare(lines, swap=False, backend=None):
+    """Plan the top layouts of lines (--list output) for the focused workspace"""
+    from . import backends, main, snapshots
+
+    workspace = main.get_workspace()
+    plans = {}
+    for layout_class in top_layouts(lines):
+        try:
+            plans[layout_class.name] = main.plan_layout(
+                layout_class(), workspace, swap, backend=backend
+            )
+        except Exception:  # layouts don't support every window count
+            continue
+    if not os.path.exists(prepared_file):
+        return  # the pick came first (see reserve)
+    main.write_atomically(
+        prepared_file,
+        json.dumps(
+            {
+                "created": time.time(),
+                "backend": backends.get(backend, swap).name,
+                "workspace": workspace.name,
+                "nuke": main.swallow_placeholders(workspace),
+                "state": snapshots.take(workspace, backends.get(backend, swap).ids),
+                "plans": plans,
+            }
+        ),
+    )
+
+
+def reserve():
+    """Replace the last menu's plans with a pending placeholder"""
+    try:
+        os.unlink(prepared_file)
+    except OSError:
+        pass
+    try:
+        prepared_file.parent.mkdir(exist_ok=True, parents=True)
+        fd = os.open(prepared_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.write(fd, b'{"pending": true}')
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def take(layout_name, swap=False, backend=None):
+    """(workspace name, placeholders to nuke, plan, the workspace's state
+    for the undo ring) prepared for this layout,
+    None if there is no (fresh) one. Either way, the prepared file is gone."""
+    from . import backends
+
+    try:
+        fd = os.open(prepared_file, os.O_RDONLY | os.O_NOFOLLOW)
+        with open(fd, "r") as op:
+            stat = os.fstat(fd)
+            prepared = json.load(op)
+        os.unlink(prepared_file)
+    except (OSError, ValueError):
+        return None
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+        return None  # planted by someone else
+    if (
+        prepared.get("pending")
+        or not 0 <= time.time() - prepared["created"] <= max_age
+        or prepared["backend"] != backends.get(backend, swap).name
+        or layout_name not in prepared["plans"]
+    ):
+        return None
+    return (
+        prepared["workspace"],
+        prepared["nuke"],
+        prepared["plans"][layout_name],
+        prepared["state"],
+    )
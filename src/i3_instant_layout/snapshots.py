@@ -0,0 +1,239 @@
+"""Save a workspace's arrangement and get it back.
+
+A snapshot is the tiling tree of a workspace in compact form:
+a window id, or [layout, [percent per child], [child]] for a split,
+with the kind of id (X11 'window' or 'id' - con_id, see backends.py),
+translated if restored with a backend that uses the other kind.
+Placeholders and single child splits are left out, floating windows
+are not part of it.
+
+--save NAME / --restore NAME keep named snapshots (snapshots.json), and
+every layout applied (and every restore) first puts the workspace's state
+on its undo ring (undo.json), which --undo goes back through. Both are
+changed under a lock - applies from the daemon and one-shot runs overlap.
+Restoring is applying a layout: diff.py if only windows moved / sizes
+changed, else the backend rebuilds it, in one i3 command (plus xdotool for
+swallow). Windows that are gone are left out, windows opened since stay
+where they are.
+
+Window ids don't survive a restart of X (or i3), neither do snapshots, really.
+"""
+import contextlib
+import json
+from .layouts import fix_percent
+
+
+undo_depth = 10
+
+
+def snapshots_file():
+    from .main import counter_file
+
+    return counter_file.with_name("snapshots.json")
+
+
+def undo_file():
+    from .main import counter_file
+
+    return counter_file.with_name("undo.json")
+
+
+@contextlib.contextmanager
+def locked():
+    """Exclusive lock for a read-modify-write of the snapshot files"""
+    import fcntl
+
+    path = snapshots_file().with_name("snapshots.lock")
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def capture(con, ids="window"):
+    """Compact tree of con's tiling windows, None if it has none"""
+    if not con.nodes:
+        if (con.window or con.ipc_data.get("app_id")) and not con.ipc_data.get(
+            "swallows"
+        ):
+            return getattr(con, ids)
+        return None
+    return compact(con.layout, [(capture(x, ids), x.percent) for x in con.nodes])
+
+
+def compact(layout, children):
+    """A split of [(child, percent)], dropping children that are None"""
+    children = [(c, p) for c, p in children if c is not None]
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0][0]
+    return [layout, fix_percent([p for c, p in children]), [c for c, p in children]]
+
+
+def prune(tree, keep):
+    """tree with only the windows in keep"""
+    if not isinstance(tree, list):
+        return tree if tree is not None and tree in keep else None
+    layout, percents, children = tree
+    return compact(layout, [(prune(c, keep), p) for c, p in zip(children, percents)])
+
+
+def translate(tree, ids):
+    """tree with its window ids replaced by ids[id] (None if not in ids)"""
+    if not isinstance(tree, list):
+        return ids.get(tree)
+    layout, percents, children = tree
+    return [layout, percents, [translate(c, ids) for c in children]]
+
+
+def windows_of(tree):
+    """The window ids in tree, in the order they fill its placeholders"""
+    if not isinstance(tree, list):
+        return [tree]
+    return [x for child in tree[2] for x in windows_of(child)]
+
+
+def to_layout(tree, percent=None):
+    """tree as an append_layout tree (see layouts.Node)"""
+    from . import layouts
+
+    if not isinstance(tree, list):
+        return layouts.node(percent, "splith", True, False)
+    layout, percents, children = tree
+    return layouts.node(
+        percent,
+        layout,
+        False,
+        [to_layout(c, p) for c, p in zip(children, percents)],
+    )
+
+
+def take(workspace, ids="window"):
+    """A snapshot of workspace, None if there are no tiled windows"""
+    tree = capture(workspace, ids)
+    if tree is None:
+        return None
+    return {"ids": ids, "tree": tree}
+
+
+def load(path):
+    try:
+        with open(path, "r") as op:
+            return json.load(op)
+    except (OSError, ValueError):
+        return {}
+
+
+def store(path, data):
+    from .main import write_atomically
+
+    write_atomically(path, json.dumps(data, separators=(",", ":")))
+
+
+def saved(name):
+    """The snapshot saved as name, None if there is none"""
+    return load(snapshots_file()).get(name)
+
+
+def save(name, snapshot):
+    with locked():
+        snapshots = load(snapshots_file())
+        snapshots[name] = snapshot
+        store(snapshots_file(), snapshots)
+
+
+def push_undo(workspace_name, snapshot):
+    """Put snapshot on the workspace's undo ring (unless it's already on top)"""
+    if snapshot is None:
+        return
+    with locked():
+        rings = load(undo_file())
+        ring = rings.setdefault(workspace_name, [])
+        if ring and ring[-1] == snapshot:
+            return
+        ring.append(snapshot)
+        del ring[:-undo_depth]
+        store(undo_file(), rings)
+
+
+def pop_undo(workspace_name, current=None):
+    """The workspace's last state that differs from current, None if none left"""
+    with locked():
+        rings = load(undo_file())
+        ring = rings.get(workspace_name, [])
+        snapshot = None
+        while ring and snapshot is None:
+            snapshot = ring.pop()
+            if snapshot == current:
+                snapshot = None
+        store(undo_file(), rings)
+    return snapshot
+
+
+def plan(snapshot, workspace, swap=False, backend=None):
+    """What restoring snapshot on workspace takes (see main.plan_layout)"""
+    from . import backends, layouts, main
+
+    backend = backends.get(backend, swap)
+    tree = snapshot["tree"]
+    if snapshot["ids"] != backend.ids:  # taken with another backend
+        tree = translate(
+            tree,
+            {
+                getattr(con, snapshot["ids"]): getattr(con, backend.ids)
+                for con in main.walk_tree(workspace)
+                if con.window
+            },
+        )
+    tree = prune(tree, set(backend.window_ids(workspace)))
+    if tree is None:
+        return None
+    layout_dict = to_layout(tree)
+    marks = main.mark_swallow_nodes(layout_dict) if backend.marked else []
+    return main.compiled_plan(
+        workspace,
+        backend,
+        "snapshot",
+        layouts.dump(layout_dict),
+        windows_of(tree),
+        marks,
+        backend.active_window(workspace),
+    )
+
+
+def apply(snapshot, workspace, swap=False, backend=None):
+    from . import main, timings
+
+    with timings.stage("nuke_swallow_windows"):
+        main.nuke_swallow_windows(workspace)
+    with timings.stage("apply_layout"):
+        main.execute_plan(plan(snapshot, workspace, swap, backend))
+
+
+def restore(snapshot, swap=False, backend=None):
+    """Put the focused workspace back the way snapshot has it
+    (its current state goes on the undo ring first)"""
+    from . import main, timings
+
+    timings.reset()
+    workspace = main.timed_get_workspace()
+    main.remember_state(workspace, swap, backend)
+    apply(snapshot, workspace, swap, backend)
+    timings.report(layout="snapshot", swap=swap, backend=backend)
+
+
+def undo(swap=False, backend=None):
+    """Go back to the focused workspace's state before the last layout
+    (or restore). False if there's nothing to go back to."""
+    from . import backends, main, timings
+
+    timings.reset()
+    workspace = main.timed_get_workspace()
+    current = take(workspace, backends.get(backend, swap).ids)
+    snapshot = pop_undo(workspace.name, current)
+    if snapshot is None:
+        return False
+    apply(snapshot, workspace, swap, backend)
+    timings.report(layout="undo", swap=swap, backend=backend)
+    return True
@@ -0,0 +1,168 @@
+"""Opt-in timing of the stages of a layout switch.
+
+Enabled by --timings (breakdown on stderr) or the environment variable
+I3_INSTANT_LAYOUT_TIMINGS: '1' means stderr, anything else is a file
+to append one json line per switch to.
+
+Every external program (fork:...) and i3 message (ipc:...) is recorded
+as well, nested in the stage that caused it.
+
+Forks and i3 messages are also counted - always, it's cheap.
+--stats shows the counts per layout switch, and budget() fails
+code paths that need more of them than they should.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+target = os.environ.get("I3_INSTANT_LAYOUT_TIMINGS") or None
+if target in ("1", "stderr"):
+    target = "-"
+
+_records = []  # [depth, name, seconds]
+_depth = threading.local()  # stages may run in background threads
+_start = None
+_counts = Counter()  # 'fork:xdotool' / 'ipc:command' ... -> how often since reset()
+_totals = Counter()  # the same, never reset - for budget()
+_counts_lock = threading.Lock()
+show_stats = False
+
+
+class OverBudget(Exception):
+    """A code path forked or talked to i3 more often than allowed"""
+
+
+def enable(where="-"):
+    """'-' for stderr, or a path to append json lines to"""
+    global target
+    target = where
+
+
+def reset():
+    global _start
+    _records.clear()
+    with _counts_lock:
+        _counts.clear()
+    _start = time.perf_counter()
+
+
+def summarize(detail):
+    """{'forks': n, 'messages': n, 'detail': detail} for {name: n}.
+
+    Connecting to i3 is not a message.
+    """
+    return {
+        "forks": sum(v for k, v in detail.items() if k.startswith("fork:")),
+        "messages": sum(
+            v
+            for k, v in detail.items()
+            if k.startswith("ipc:") and k != "ipc:connect"
+        ),
+        "detail": detail,
+    }
+
+
+def counts():
+    """summarize()d counts since reset()"""
+    with _counts_lock:
+        return summarize(dict(_counts))
+
+
+@contextmanager
+def budget(forks=None, messages=None):
+    """Raise OverBudget if the enclosed block forks / sends i3 messages
+    more often than this (None: don't care). reset()s inside don't matter."""
+    with _counts_lock:
+        before = dict(_totals)
+    yield
+    with _counts_lock:
+        used = summarize(
+            {
+                k: v - before.get(k, 0)
+                for k, v in _totals.items()
+                if v > before.get(k, 0)
+            }
+        )
+    if (forks is not None and used["forks"] > forks) or (
+        messages is not None and used["messages"] > messages
+    ):
+        raise OverBudget(
+            f"{used['forks']} forks / {used['messages']} i3 messages, "
+            f"budget {forks} / {messages}: {used['detail']}"
+        )
+
+
+def format_counts(stats):
+    def detail(prefix):
+        return ", ".join(
+            f"{k[len(prefix):]}: {v}"
+            for k, v in sorted(stats["detail"].items())
+            if k.startswith(prefix) and k != "ipc:connect"
+        )
+
+    return (
+        f"forks: {stats['forks']} ({detail('fork:')})\n"
+        f"i3 messages: {stats['messages']} ({detail('ipc:')})"
+    )
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as name"""
+    if name.startswith(("fork:", "ipc:")):
+        with _counts_lock:
+            _counts[name] += 1
+            _totals[name] += 1
+    if target is None:
+        yield
+        return
+    depth = getattr(_depth, "value", 0)
+    record = [depth, name, None]
+    _records.append(record)  # keep the order in which stages started
+    _depth.value = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.value = depth
+        record[2] = time.perf_counter() - start
+
+
+def report(**info):
+    """Write the breakdown (since reset()), info goes along in the json.
+
+    With show_stats, the fork / message counts go to stderr as well.
+    """
+    if show_stats:
+        print(format_counts(counts()), file=sys.stderr)
+    if target is None or _start is None:
+        return
+    total = time.perf_counter() - _start
+    records = [x for x in _records if x[2] is not None]
+    if target == "-":
+        for depth, name, seconds in records:
+            print(
+                f"{'  ' * depth}{name:<{40 - 2 * depth}} {seconds * 1000:8.2f} ms",
+                file=sys.stderr,
+            )
+        print(f"{'total':<40} {total * 1000:8.2f} ms", file=sys.stderr)
+    else:
+        import json
+        import platform
+
+        line = dict(info)
+        line.update(
+            {
+                "timestamp": time.time(),
+                "host": platform.node(),
+                "total": total,
+                "counts": counts(),
+                "stages": [[depth, name, seconds] for depth, name, seconds in records],
+            }
+        )
+        with open(target, "a") as op:
+            op.write(json.dumps(line) + "\n")
@@ -0,0 +1,100 @@
+"""Keep workspaces in their layout while windows come and go.
+
+Listens for i3 window events, and re-applies the layout last applied
+to every workspace whose windows changed. Events are debounced - a burst
+(say a session restore opening 20 windows) leads to one re-layout
+once things calm down.
+Workspaces whose set of windows didn't change are left alone, so the events
+our own re-layouts cause cost one tree query, and nothing else.
+"""
+import queue
+import sys
+import threading
+import time
+
+
+debounce = 0.15  # seconds of quiet before we re-layout
+max_delay = 2.0  # but don't wait longer than this for a burst to end
+
+
+def window_sets(tree, swap=False, backend=None):
+    """{workspace name: set of window ids} - X11 ids, or con ids on sway"""
+    from . import backends
+
+    window_ids = backends.get(backend, swap).window_ids
+    return {ws.name: set(window_ids(ws)) for ws in tree.workspaces()}
+
+
+def get_tree():
+    from . import main, timings
+
+    with timings.stage("ipc:get_tree"):
+        return main.get_i3().get_tree()
+
+
+def relayout(known, swap=False, backend=None):
+    """Re-apply the remembered layouts of workspaces whose windows changed.
+
+    known is {workspace name: window ids} as of our last re-layout -
+    layouts that leave placeholders never look 'done' to diff.py,
+    so we must not re-apply them just because something moved.
+    """
+    from . import main
+
+    tree = get_tree()
+    remembered = main.load_workspace_layouts()
+    todo = []
+    for name, windows in window_sets(tree, swap, backend).items():
+        if name in remembered and known.get(name) != windows:
+            known[name] = windows
+            todo.append((name, remembered[name]))
+    if todo:
+        main.apply_to_workspaces(todo, swap, tree, backend=backend, undo=False)
+
+
+def wait_for_quiet(events):
+    """Block until there were events, and then no events for debounce seconds"""
+    events.get()
+    start = time.monotonic()
+    while time.monotonic() - start < max_delay:
+        try:
+            events.get(timeout=debounce)
+        except queue.Empty:
+            break
+
+
+def listen(events):
+    """Put every relevant i3 event into events. Blocks"""
+    import i3ipc
+
+    subscription = i3ipc.Connection(auto_reconnect=True)
+    for event in [
+        i3ipc.Event.WINDOW_NEW,
+        i3ipc.Event.WINDOW_CLOSE,
+        i3ipc.Event.WINDOW_MOVE,
+        i3ipc.Event.WINDOW_FLOATING,
+    ]:
+        subscription.on(event, lambda i3, e: events.put(e.change))
+    subscription.main()
+
+
+def watch(swap=False, lock=None, backend=None, events=None):
+    """Re-layout after window events, forever.
+
+    lock (optional) is held while re-layouting - the daemon shares it.
+    events (optional) is a queue to take the events from instead of i3.
+    """
+    if events is None:
+        events = queue.Queue()
+        threading.Thread(target=listen, args=(events,), daemon=True).start()
+    lock = lock or threading.Lock()
+    # as things are now - only workspaces that change from here on are re-applied
+    with lock:
+        known = window_sets(get_tree(), swap, backend)
+    while True:
+        wait_for_quiet(events)
+        try:
+            with lock:
+                relayout(known, swap, backend)
+        except Exception as e:  # e.g. a layout that can't do this many windows
+            print(f"Re-layout failed: {e}", file=sys.stderr)
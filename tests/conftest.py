@@ -1,10 +1,46 @@
 # -*- coding: utf-8 -*-
 """
-    Dummy conftest.py for i3_autolayout.
+    Fixtures for the i3_instant_layout tests.
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    https://pytest.org/latest/plugins.html
+    state: all files (usage, caches, snapshots, ...) in a temporary directory.
+    fake_i3: start(windows) puts a fresh FakeI3 (see fakei3.py) in place,
+    with main talking to it and its xdotool.
 """
+import pytest
+from i3_instant_layout import cache, fakei3, main, prepared
 
-# import pytest
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    counter_file = tmp_path / "share" / "counter.json"
+    monkeypatch.setattr(main, "counter_file", counter_file)
+    monkeypatch.setattr(main, "ranked_file", counter_file.with_name("ranked.txt"))
+    monkeypatch.setattr(main, "journal_file", counter_file.with_name("usage.log"))
+    monkeypatch.setattr(main, "lock_file", counter_file.with_name("usage.lock"))
+    monkeypatch.setattr(
+        main, "workspace_layouts_file", counter_file.with_name("workspaces.json")
+    )
+    monkeypatch.setattr(main, "_usage", None)
+    monkeypatch.setattr(main, "_journal_size", 0)
+    monkeypatch.setattr(cache, "cache_dir", tmp_path / "layout_cache")
+    monkeypatch.setattr(prepared, "prepared_file", tmp_path / "prepared.json")
+    cache._memory.clear()
+    return tmp_path
+
+
+@pytest.fixture
+def fake_i3(state, monkeypatch):
+    fakes = []
+
+    def start(windows=0, **kwargs):
+        while fakes:
+            fakes.pop().stop()
+        fake = fakei3.FakeI3(windows, **kwargs).start()
+        fakes.append(fake)
+        monkeypatch.setattr(main, "run", fake.run)
+        monkeypatch.setattr(main, "_i3", None)
+        return fake
+
+    yield start
+    while fakes:
+        fakes.pop().stop()
@@ -0,0 +1,151 @@
+import json
+import pytest
+from i3_instant_layout import cache, fakei3, geometry, layouts, main
+
+backends = ["swallow", "swap", "ipc"]
+# layouts whose placeholders the windows fill completely
+filled = [
+    ("vStack", 3),
+    ("hStack", 4),
+    ("tabbed", 3),
+    ("max", 2),
+    ("mainLeft", 5),
+    ("mainCenter", 4),
+    ("MainVStackMain", 5),
+    ("NestedRight", 6),
+    ("matrix", 4),
+]
+# backend: (get_tree, i3 commands, forks) for a switch that rebuilds
+round_trips = {"swallow": (1, 2, 2), "swap": (1, 1, 0), "ipc": (1, 1, 0)}
+
+
+def window_rects(fake):
+    """{X11 id: (x, y, width, height)} on the focused workspace"""
+    tree = json.loads(fake.get_tree())
+    result = {}
+    todo = [tree]
+    while todo:
+        c = todo.pop()
+        todo.extend(c["nodes"] + c["floating_nodes"])
+        if c["window"]:
+            r = c["rect"]
+            result[c["window"]] = (r["x"], r["y"], r["width"], r["height"])
+    return result
+
+
+def main_windows(fake):
+    return [c for c, _ in fake.walk(fake.workspace()) if c["window"]]
+
+
+def expected_rects(layout_name, windows):
+    """What geometry.py says the windows get - windows[0] is the active one"""
+    layout = layouts.registry.get(layout_name)()
+    return dict(
+        zip(windows, geometry.window_rectangles(layout, len(windows), 1920, 1080))
+    )
+
+
+def assert_close(actual, expected, backend):
+    # the ipc backend resizes in whole percents
+    tolerance = 20 if backend == "ipc" else 0
+    assert actual.keys() == expected.keys()
+    for window, rect in expected.items():
+        assert all(abs(a - b) <= tolerance for a, b in zip(actual[window], rect)), (
+            window,
+            actual[window],
+            rect,
+        )
+
+
+@pytest.mark.parametrize("backend", backends)
+@pytest.mark.parametrize("layout_name, window_count", filled)
+def test_apply_named(fake_i3, backend, layout_name, window_count):
+    fake = fake_i3(window_count - 1)
+    fake.add_window(floating=True)  # no way around a rebuild then
+    windows = [c["window"] for c in main_windows(fake)]
+    assert main.apply_named(layout_name, backend=backend) == layout_name
+    assert_close(window_rects(fake), expected_rects(layout_name, windows), backend)
+    assert not fake.placeholders()
+    assert (
+        fake.count(fakei3.GET_TREE),
+        fake.count(fakei3.RUN_COMMAND),
+        len(fake.forks),
+    ) == round_trips[backend]
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_adjust_is_one_command(fake_i3, backend):
+    fake = fake_i3(3)  # side by side
+    windows = [c["window"] for c in main_windows(fake)]
+    main.apply_named("vStack", backend=backend)
+    assert_close(window_rects(fake), expected_rects("vStack", windows), backend)
+    assert fake.count(fakei3.GET_TREE) == 1
+    assert len(fake.commands) == 1
+    assert "layout splitv" in fake.commands[0]
+    assert not fake.forks
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_reapply_only_queries(fake_i3, backend):
+    fake = fake_i3(5)
+    main.apply_named("mainLeft", backend=backend)
+    before = list(fake.requests), list(fake.forks)
+    cache._memory.clear()
+    main.apply_named("mainLeft", backend=backend)
+    assert fake.requests[len(before[0]) :] == [(fakei3.GET_TREE, "")]
+    assert fake.forks == before[1]
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_switch_between_layouts(fake_i3, backend):
+    fake = fake_i3(4)
+    windows = [c["window"] for c in main_windows(fake)]
+    for layout_name in ["mainLeft", "matrix", "hStack", "tabbed", "mainLeft"]:
+        main.apply_named(layout_name, backend=backend)
+        assert_close(
+            window_rects(fake), expected_rects(layout_name, windows), backend
+        )
+
+
+def test_leftover_placeholders_are_nuked(fake_i3):
+    fake = fake_i3(3)
+    main.apply_named("matrix")  # 4 cells, 3 windows
+    assert len(fake.placeholders()) == 1
+    main.apply_named("vStack")
+    assert not fake.placeholders()
+    assert sorted(window_rects(fake)) == sorted(
+        c["window"] for c in main_windows(fake)
+    )
+
+
+def test_sway_windows(fake_i3):
+    fake = fake_i3()
+    for ii in range(3):
+        fake.add_window(app_id=f"app{ii}")
+    assert main.apply_named("hStack", backend="ipc") == "hStack"
+    widths = sorted(c["rect"]["width"] for c in main_windows_any(fake))
+    assert widths == [640, 640, 640]
+    assert not fake.forks
+
+
+def main_windows_any(fake):
+    return [
+        c
+        for c, _ in fake.walk(fake.workspace())
+        if (c["window"] or c.get("app_id")) and not c["nodes"]
+    ]
+
+
+def test_dry_run_changes_nothing(fake_i3, capsys):
+    fake = fake_i3(3)
+    main.apply_named("mainLeft", dry_run=True)
+    assert fake.commands == []
+    assert json.loads(capsys.readouterr().out)
+
+
+def test_unknown_layout(fake_i3, monkeypatch):
+    fake_i3(3)
+    started = []
+    monkeypatch.setattr(main, "in_background", lambda *args: started.append(args))
+    assert main.apply_named("noSuchLayoutAtAll") is None
+    assert started == []  # no tree query (or anything else) left running
@@ -0,0 +1,69 @@
+import pytest
+from i3_instant_layout import auto, main
+
+
+def test_unused_auto_is_not_the_default():
+    order = main.smart_order({})
+    assert order[-2:] == ["auto", "best (auto)"]
+    assert main.smart_order({"auto": (3, 1.0)})[0] == "auto"
+
+
+def test_one_x_connection(monkeypatch):
+    display = pytest.importorskip("Xlib.display")
+    opened = []
+
+    class Display:
+        def __init__(self):
+            opened.append(self)
+
+        def create_resource_object(self, kind, window_id):
+            raise ValueError("no such window")
+
+    monkeypatch.setattr(display, "Display", Display)
+    monkeypatch.setattr(auto, "_display", None)
+    for _ in range(3):
+        assert auto.min_sizes([1, 2]) == [auto.default_min_size] * 2
+    assert len(opened) == 1
+
+
+def fits(rects, mins):
+    return all(w >= mw and h >= mh for (_, _, w, h), (mw, mh) in zip(rects, mins))
+
+
+@pytest.mark.parametrize("window_count", [2, 3, 4])
+@pytest.mark.parametrize("min_size", [(1000, 240), (400, 700)])
+def test_minimum_sizes_rule_layouts_out(state, window_count, min_size):
+    mins = [min_size] * window_count
+    rects = auto.all_rectangles(1920, 1080, window_count)
+    chosen = auto.best(1920, 1080, mins)
+    assert fits(rects[chosen], mins)
+    assert len(set(rects[chosen])) == window_count  # nothing hidden
+
+
+def test_wide_windows_are_stacked(state):
+    assert auto.best(1920, 1080, [auto.default_min_size] * 3) == "hStack"
+    assert auto.best(1920, 1080, [(1000, 240)] * 3) == "vStack"
+
+
+def test_hidden_windows_score_lower(state):
+    rects = auto.all_rectangles(1920, 1080, 2)
+    mins = [auto.default_min_size] * 2
+    assert auto.score(rects["tabbed"], mins) < auto.score(rects["hStack"], mins)
+
+
+def test_tie_goes_to_the_first_registered(state):
+    rects = auto.all_rectangles(1920, 1080, 1)
+    tied = [name for name, r in rects.items() if r == [(0, 0, 1920, 1080)]]
+    assert len(tied) > 1
+    registered = [cls.name for cls in auto.candidates()]
+    chosen = auto.best(1920, 1080, [auto.default_min_size])
+    assert chosen == min(tied, key=registered.index)
+
+
+def test_auto_applies_the_pick(fake_i3, monkeypatch):
+    fake = fake_i3(3)
+    monkeypatch.setattr(auto, "min_sizes", lambda windows: [(1000, 240)] * len(windows))
+    main.apply_named("auto")
+    fake.get_tree()  # places the windows
+    tree = fake.walk(fake.workspace())
+    assert [c["rect"]["width"] for c, _ in tree if c["window"]] == [1920] * 3
@@ -0,0 +1,43 @@
+import pytest
+from i3_instant_layout import bench, layouts, main, timings
+
+window_counts = [1, 2, 3, 5, 8]
+
+
+def test_budget_catches_overruns(fake_i3):
+    fake_i3(3)
+    with pytest.raises(timings.OverBudget):
+        with timings.budget(forks=0, messages=1):
+            main.get_workspace()
+            main.i3_command("nop")
+    with timings.budget(forks=0, messages=2):
+        main.get_workspace()
+        main.i3_command("nop")
+
+
+@pytest.mark.parametrize("backend", sorted(bench.budgets))
+@pytest.mark.parametrize("layout_class", list(layouts.registry), ids=lambda x: x.name)
+def test_switch_within_budget(fake_i3, backend, layout_class):
+    forks, messages = bench.budgets[backend]
+    for window_count in window_counts:
+        if not bench.supported(layout_class, window_count):
+            continue
+        # a flat workspace (the diff path, if the structure fits)
+        fake_i3(window_count)
+        with timings.budget(forks, messages):
+            main.apply_named(layout_class.name, backend=backend)
+        if window_count == 1:
+            continue
+        # a floating window (not the focused one) forces a rebuild
+        fake = fake_i3(window_count - 1)
+        fake.add_window(floating=True)
+        with timings.budget(forks, messages):
+            main.apply_named(layout_class.name, backend=backend)
+        # again (placeholders left over are one more message)
+        extra = 1 if fake.placeholders() else 0
+        with timings.budget(forks, messages + extra):
+            main.apply_named(layout_class.name, backend=backend)
+
+
+def test_check_budgets():
+    assert bench.check_budgets(window_counts=[2, 5]) == []
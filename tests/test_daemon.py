@@ -0,0 +1,54 @@
+import os
+import socket
+import threading
+import pytest
+from i3_instant_layout import daemon
+
+
+@pytest.fixture
+def serving(fake_i3, tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "request_timeout", 0.2)
+    fake = fake_i3(3)
+    path = tmp_path / "run" / "daemon.sock"
+    threading.Thread(target=daemon.serve, args=(path,), daemon=True).start()
+    while not path.exists():
+        threading.Event().wait(0.01)
+    return fake, path
+
+
+def test_apply_through_the_socket(serving):
+    fake, path = serving
+    assert daemon.send("vStack", path) == "ok vStack"
+    assert daemon.send("noSuchLayoutAtAll", path).startswith("error")
+    assert os.stat(path.parent).st_mode & 0o777 == 0o700
+
+
+def test_idle_client_does_not_block(serving):
+    fake, path = serving
+    idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    idle.connect(str(path))  # and never sends a thing
+    replies = []
+    sender = threading.Thread(target=lambda: replies.append(daemon.send("hStack", path)))
+    sender.start()
+    sender.join(timeout=5)
+    idle.close()
+    assert replies == ["ok hStack"]
+
+
+def test_shared_directory_is_refused(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        daemon.send("vStack", shared / "daemon.sock")
+    with pytest.raises(PermissionError):
+        daemon.serve(shared / "daemon.sock")
+
+
+def test_unknown_flags_are_refused(serving, capsys):
+    fake, path = serving
+    assert daemon.send("vStack --dry-run", path) == "error unknown flag --dry-run"
+    assert daemon.client("vStack --dry-run") is False
+    assert "--dry-run" in capsys.readouterr().err
+    assert not fake.commands
+    assert daemon.send("vStack --swap --backend=ipc", path) == "ok vStack"
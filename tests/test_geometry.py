@@ -0,0 +1,107 @@
+"""Rectangles worked out by hand - not by i3 (or the fake, which uses geometry.py)"""
+import pytest
+from i3_instant_layout import geometry, layouts
+
+placeholder = {"swallows": [[{"class": "."}]]}
+
+
+def window_rectangles(layout_name, window_count, width, height):
+    layout = layouts.registry.get(layout_name)()
+    return geometry.window_rectangles(layout, window_count, width, height)
+
+
+def test_split_adds_up():
+    assert geometry.split(0, 1000, [1 / 3] * 3) == [(0, 333), (333, 334), (667, 333)]
+    assert geometry.split(10, 7, [0.5, 0.5]) == [(10, 4), (14, 3)]
+
+
+def test_rectangles_of_a_dict_layout():
+    layout = {
+        "layout": "splith",
+        "nodes": [
+            dict(placeholder, percent=0.5),
+            dict(placeholder, percent=0.25),
+            {
+                "layout": "splitv",
+                "percent": 0.25,
+                "nodes": [dict(placeholder), dict(placeholder)],
+            },
+        ],
+    }
+    assert geometry.rectangles(layout, 1000, 400) == [
+        (0, 0, 500, 400),
+        (500, 0, 250, 400),
+        (750, 0, 250, 200),
+        (750, 200, 250, 200),
+    ]
+
+
+@pytest.mark.parametrize(
+    "layout_name, window_count, width, height, expected",
+    [
+        (
+            "vStack",
+            3,
+            1920,
+            1080,
+            [(0, 0, 1920, 360), (0, 360, 1920, 360), (0, 720, 1920, 360)],
+        ),
+        (
+            "hStack",
+            3,
+            1000,
+            500,
+            [(0, 0, 333, 500), (333, 0, 334, 500), (667, 0, 333, 500)],
+        ),
+        (
+            "mainLeft",
+            3,
+            1920,
+            1080,
+            [(0, 0, 960, 1080), (960, 0, 960, 540), (960, 540, 960, 540)],
+        ),
+        ("tabbed", 2, 800, 600, [(0, 0, 800, 600)] * 2),
+        (
+            "matrix",
+            3,
+            1920,
+            1080,
+            [(0, 0, 960, 540), (960, 0, 960, 540), (0, 540, 960, 540)],
+        ),
+        # remap order: 1 left, 2 right, the others stacked in the middle
+        (
+            "MainVStackMain",
+            4,
+            1920,
+            1080,
+            [
+                (0, 0, 640, 1080),
+                (1280, 0, 640, 1080),
+                (640, 0, 640, 540),
+                (640, 540, 640, 540),
+            ],
+        ),
+    ],
+)
+def test_window_rectangles(layout_name, window_count, width, height, expected):
+    assert window_rectangles(layout_name, window_count, width, height) == expected
+
+
+def test_batch_rectangles():
+    layout = layouts.registry.get("MainVStackMain")()
+    assert geometry.batch_rectangles(layout, [1, 3], 100, 100) == {
+        1: None,  # needs two windows at least
+        3: [(0, 0, 33, 100), (67, 0, 33, 100), (33, 0, 34, 100)],
+    }
+
+
+def test_to_array():
+    numpy = pytest.importorskip("numpy")
+    array = geometry.to_array(
+        {1: [(0, 0, 100, 100)], 2: None, 3: [(0, 0, 33, 100), (67, 0, 33, 100), None]}
+    )
+    assert array.shape == (3, 3, 4)
+    assert array.dtype == numpy.int32
+    assert array[0].tolist() == [[0, 0, 100, 100], [0, 0, 0, 0], [0, 0, 0, 0]]
+    assert not array[1].any()
+    assert array[2].tolist() == [[0, 0, 33, 100], [67, 0, 33, 100], [0, 0, 0, 0]]
@@ -0,0 +1,85 @@
+import json
+import pytest
+from i3_instant_layout import layouts, main
+
+
+@pytest.mark.parametrize("layout_name", ["mainLeft", "matrix", "NestedRight"])
+def test_marks_without_dicts(monkeypatch, layout_name):
+    tree = layouts.registry.get(layout_name)().get_json(5)
+    as_dicts = json.loads(layouts.dump(tree))
+
+    def no_dicts(self):
+        raise AssertionError("to_dict() called")
+
+    monkeypatch.setattr(layouts.Node, "to_dict", no_dicts)
+    monkeypatch.setattr(layouts.Split, "to_dict", no_dicts)
+    marks = main.mark_swallow_nodes(tree)
+    assert marks and marks == main.mark_swallow_nodes(as_dicts)  # the dict way
+    assert json.loads(layouts.dump(tree)) == as_dicts
+
+
+def dummy(name, aliases=()):
+    return type(name.title(), (), {"name": name, "aliases": list(aliases)})
+
+
+@pytest.fixture
+def registry():
+    registry = layouts.LayoutRegistry()
+    registry.register(dummy("mainLeft", ["ml"]))
+    registry.register(dummy("mainRight", ["mr"]))
+    registry.register(dummy("matrix"))
+    return registry
+
+
+@pytest.mark.parametrize(
+    "name, aliases",
+    [("mainleft", []), ("other", ["MAINRIGHT"]), ("other", ["Ml"])],
+)
+def test_register_refuses_duplicates(registry, name, aliases):
+    with pytest.raises(ValueError, match="already used"):
+        registry.register(dummy(name, aliases))
+    assert "other" not in registry.by_lower_name  # nothing half registered
+    assert len(registry) == 3
+
+
+def test_register_refuses_spaces(registry):
+    with pytest.raises(ValueError, match="No spaces"):
+        registry.register(dummy("main left"))
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("mainLeft", "mainLeft"),  # exact
+        ("MAINLEFT", "mainLeft"),  # case
+        ("mr", "mainRight"),  # alias
+        ("mainl", "mainLeft"),  # unique prefix
+        ("matr", "matrix"),
+        ("mainLetf", "mainLeft"),  # typo
+        ("matirx", "matrix"),
+    ],
+)
+def test_find(registry, query, expected):
+    assert registry.find(query).name == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "ma",  # a prefix of all three
+        "main",  # of mainLeft and mainRight
+        "mainRigth-ish",  # no prefix, too far off for a typo
+        "stack",
+    ],
+)
+def test_find_nothing(registry, query):
+    assert registry.find(query) is None
+
+
+def test_find_ambiguous_typo():
+    # two equally close matches - guessing would be a coin flip
+    registry = layouts.LayoutRegistry()
+    registry.register(dummy("stackA"))
+    registry.register(dummy("stackB"))
+    assert registry.find("stackC") is None
+    assert registry.find("stackA") and registry.find("stackb")
@@ -0,0 +1,60 @@
+import os
+import pytest
+from i3_instant_layout import fakei3, main, prepared
+
+listed = ["mainLeft", "vStack", "hStack"]
+
+
+def test_prepared_apply_skips_the_tree(fake_i3):
+    fake = fake_i3(3)
+    prepared.reserve()
+    prepared.prepare(listed)
+    before = fake.count(fakei3.GET_TREE)
+    assert main.apply_named("vStack", use_prepared=True) == "vStack"
+    assert fake.count(fakei3.GET_TREE) == before
+    assert not os.path.lexists(prepared.prepared_file)
+
+
+def test_planted_file_is_ignored(fake_i3):
+    fake_i3(3)
+    prepared.reserve()
+    prepared.prepare(listed)
+    os.chmod(prepared.prepared_file, 0o666)
+    assert prepared.take("vStack") is None
+
+
+def test_symlink_is_ignored(fake_i3, tmp_path):
+    fake_i3(3)
+    prepared.reserve()
+    prepared.prepare(listed)
+    elsewhere = tmp_path / "elsewhere.json"
+    os.replace(prepared.prepared_file, elsewhere)
+    os.symlink(elsewhere, prepared.prepared_file)
+    assert prepared.take("vStack") is None
+
+
+def test_late_plans_are_not_written(fake_i3):
+    fake_i3(3)
+    prepared.reserve()
+    main.apply_named("vStack", use_prepared=True)  # picked before prepare
+    prepared.prepare(listed)
+    assert not os.path.lexists(prepared.prepared_file)
+
+
+@pytest.mark.parametrize("backend", ["swallow", "swap", "ipc"])
+def test_closed_window_falls_back(fake_i3, backend):
+    fake = fake_i3(4)
+    prepared.reserve()
+    prepared.prepare(listed, backend=backend)
+    closed = main_windows(fake)[-1]
+    main.i3_command(f"[con_id={closed['id']}] kill")
+    before = fake.count(fakei3.GET_TREE)
+    assert main.apply_named("mainLeft", backend=backend, use_prepared=True)
+    assert fake.count(fakei3.GET_TREE) == before + 1  # did it the normal way
+    fake.get_tree()  # places the windows
+    assert [c["rect"]["width"] for c in main_windows(fake)] == [960] * 3
+    assert not fake.placeholders()
+
+
+def main_windows(fake):
+    return [c for c, _ in fake.walk(fake.workspace()) if c["window"]]
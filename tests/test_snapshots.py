@@ -0,0 +1,45 @@
+import threading
+from i3_instant_layout import main, snapshots
+
+
+def test_overlapping_pushes_keep_everything(state):
+    snapshots.save("work", {"ids": "window", "tree": 1})
+    threads = [
+        threading.Thread(
+            target=snapshots.push_undo, args=(str(ii), {"ids": "window", "tree": ii})
+        )
+        for ii in range(20)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for ii in range(20):
+        assert snapshots.pop_undo(str(ii)) == {"ids": "window", "tree": ii}
+    assert snapshots.saved("work") == {"ids": "window", "tree": 1}
+
+
+def test_undo_ring(state):
+    for ii in range(snapshots.undo_depth + 2):
+        snapshots.push_undo("1", {"ids": "window", "tree": ii})
+    snapshots.push_undo("1", {"ids": "window", "tree": ii})  # already on top
+    popped = []
+    while True:
+        snapshot = snapshots.pop_undo("1", current={"ids": "window", "tree": 5})
+        if snapshot is None:
+            break
+        popped.append(snapshot["tree"])
+    assert popped == [11, 10, 9, 8, 7, 6, 4, 3, 2]
+
+
+def test_restore_and_undo(fake_i3):
+    fake_i3(3)
+    main.apply_named("vStack")
+    tall = snapshots.take(main.get_workspace())
+    snapshots.save("tall", tall)
+    main.apply_named("hStack")
+    wide = snapshots.take(main.get_workspace())
+    snapshots.restore(snapshots.saved("tall"))
+    assert snapshots.take(main.get_workspace()) == tall
+    assert snapshots.undo()
+    assert snapshots.take(main.get_workspace()) == wide
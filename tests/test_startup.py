@@ -0,0 +1,104 @@
+"""--list is on the critical path of the rofi menu - keep its imports light
+
+Two checks: the fast-path flags must not pull in the heavy modules, and
+importing main has to fit into a time budget, as measured by -X importtime.
+"""
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+# microseconds, cumulative - main takes ~45ms here, i3ipc alone ~60ms.
+# Twice what it takes, but importing i3ipc eagerly would blow it.
+budget = 90_000
+
+heavy = ["i3ipc", "subprocess", "asyncio", "tempfile", "Xlib"]
+
+# Runs main() with argv, prints the modules that were imported by the time
+# stdout was closed (the menu has its list) - or main() returned.
+script = """
+import io, json, sys
+seen = []
+
+
+class Out(io.StringIO):
+    def isatty(self):
+        return {tty}
+
+    def close(self):
+        if not seen:
+            seen.append(sorted(sys.modules))
+        super().close()
+
+
+real_stdout = sys.stdout
+sys.stdout = Out()
+sys.argv = ["i3-instant-layout"] + {argv!r}
+from i3_instant_layout.main import main
+try:
+    main()
+except SystemExit:
+    pass
+if not seen:
+    seen.append(sorted(sys.modules))
+real_stdout.write(json.dumps(seen[0]))
+"""
+
+
+def imported_by(argv, tmp_path, tty=False):
+    env = dict(
+        os.environ,
+        HOME=str(tmp_path),
+        XDG_RUNTIME_DIR=str(tmp_path),
+        I3SOCK=str(tmp_path / "no-i3-here"),
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script.format(argv=argv, tty=tty)],
+        env=env,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return set(json.loads(result.stdout))
+
+
+@pytest.mark.parametrize(
+    "argv, tty",
+    [
+        (["--list"], False),
+        (["--list"], True),
+        (["--version"], True),
+        (["--help"], True),
+        (["--desc"], True),
+    ],
+)
+def test_startup_stays_light(tmp_path, argv, tty):
+    # the first --list writes the ranked list (with tempfile)
+    modules = imported_by(argv, tmp_path, tty)
+    assert not [x for x in heavy if x in modules and x != "tempfile"]
+    # from then on, it's just read
+    modules = imported_by(argv, tmp_path, tty)
+    assert "i3_instant_layout.main" in modules
+    assert not [x for x in heavy if x in modules]
+
+
+def import_time(module):
+    """Cumulative import time of module in microseconds, from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = [x.strip() for x in line.split("|")]
+        if fields[-1] == module:
+            return int(fields[1])
+    raise AssertionError(f"{module} not in -X importtime output")
+
+
+def test_import_budget():
+    import_time("i3_instant_layout.main")  # make sure the .pyc files exist
+    # the best of three, the others are noise from the machine
+    took = min(import_time("i3_instant_layout.main") for _ in range(3))
+    assert took < budget
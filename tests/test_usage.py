@@ -0,0 +1,79 @@
+import json
+import time
+import pytest
+from i3_instant_layout import main
+
+
+def used_elsewhere(layout_name, times):
+    """What one-shot runs (another process) append to the journal"""
+    with open(main.journal_file, "a") as op:
+        for _ in range(times):
+            op.write(f"{layout_name}\t{time.time()}\n")
+
+
+def test_counts_add_up(state):
+    for layout_name in ["mainLeft", "matrix", "mainLeft"]:
+        main.count_usage(layout_name)
+    usage = main.load_usage()
+    assert usage["mainLeft"][0] == 2
+    assert usage["matrix"][0] == 1
+    assert main.ranked_file.read_text().splitlines()[:2] == ["mainLeft", "matrix"]
+
+
+def test_daemon_sees_other_instances(state):
+    main.keep_usage_warm()
+    main.count_usage("mainLeft")
+    used_elsewhere("matrix", 5)
+    main.count_usage("mainLeft")
+    assert main.load_usage()["matrix"][0] == 5
+    assert main.load_usage()["mainLeft"][0] == 2
+
+
+def test_daemon_compaction_keeps_other_instances(state, monkeypatch):
+    main.keep_usage_warm()
+    main.count_usage("mainLeft")
+    used_elsewhere("matrix", 5)
+    monkeypatch.setattr(main, "max_journal_size", 0)
+    main.count_usage("mainLeft")
+    with open(main.counter_file) as op:
+        usage = json.load(op)
+    usage.pop("_journal")
+    assert usage["matrix"][0] == 5
+    assert usage["mainLeft"][0] == 2
+    assert main.journal_file.stat().st_size == 0
+    assert {k: list(v) for k, v in main.load_usage().items()} == usage
+
+
+def test_failed_apply_does_not_count(fake_i3, monkeypatch):
+    fake_i3(3)
+
+    def fail(*args, **kwargs):
+        raise ZeroDivisionError()
+
+    monkeypatch.setattr(main, "apply_layout", fail)
+    with pytest.raises(ZeroDivisionError):
+        main.apply_named("mainLeft")
+    assert main.load_usage() == {}
+    assert not list(main.counter_file.parent.glob("*.tmp"))
+
+
+def test_crash_while_compacting(state, monkeypatch):
+    for _ in range(3):
+        main.count_usage("mainLeft")
+    write_atomically = main.write_atomically
+
+    def crash_before_new_journal(path, text):
+        if path == main.journal_file:
+            raise KeyboardInterrupt()
+        write_atomically(path, text)
+
+    monkeypatch.setattr(main, "write_atomically", crash_before_new_journal)
+    with pytest.raises(KeyboardInterrupt):
+        main.compact_usage()
+    monkeypatch.setattr(main, "write_atomically", write_atomically)
+    assert main.load_usage()["mainLeft"][0] == 3  # not 6
+    main.count_usage("mainLeft")
+    assert main.load_usage()["mainLeft"][0] == 4
+    main.compact_usage()
+    assert main.load_usage()["mainLeft"][0] == 4
+    assert main.journal_file.stat().st_size == 0
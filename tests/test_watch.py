@@ -0,0 +1,74 @@
+import json
+import queue
+import threading
+import time
+import pytest
+from i3_instant_layout import fakei3, main, watch
+
+
+def widths(fake, name=None):
+    """Widths of the windows on workspace name (all of them by default)"""
+    tree = json.loads(fake.get_tree())
+    todo, result = [tree], []
+    while todo:
+        c = todo.pop()
+        if c["type"] == "workspace" and name is not None and c["name"] != name:
+            continue
+        todo.extend(c["nodes"])
+        if not c["nodes"] and (c["window"] or c.get("app_id")):
+            result.append(c["rect"]["width"])
+    return sorted(result)
+
+
+def eventually(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize("app_id", [None, "app"])
+def test_new_window_is_laid_out(fake_i3, app_id):
+    fake = fake_i3()
+    for ii in range(3):
+        fake.add_window(app_id=app_id and f"{app_id}{ii}")
+    backend = "ipc" if app_id else None
+    main.apply_named("hStack", backend=backend)
+    known = {}
+    watch.relayout(known, backend=backend)
+    fake.add_window(app_id=app_id and f"{app_id}3")
+    watch.relayout(known, backend=backend)
+    assert widths(fake) == [480] * 4
+    # nothing changed since - just the one query
+    requests = len(fake.requests)
+    watch.relayout(known, backend=backend)
+    assert fake.requests[requests:] == [(fakei3.GET_TREE, "")]
+
+
+def test_watch_loop(fake_i3, monkeypatch):
+    monkeypatch.setattr(watch, "debounce", 0.02)
+    fake = fake_i3(3)
+    main.apply_named("mainLeft")
+    fake.add_workspace("2")
+    for _ in range(2):
+        fake.add_window("2")
+    main.remember_layout("2", "vStack")  # from an earlier session, say
+    events = queue.Queue()
+    queries = fake.count(fakei3.GET_TREE)
+    threading.Thread(
+        target=watch.watch, kwargs=dict(events=events), daemon=True
+    ).start()
+    assert eventually(lambda: fake.count(fakei3.GET_TREE) > queries)  # seeded
+
+    fake.add_window()  # lands next to the main window
+    assert widths(fake, "1") != [960] * 4
+    events.put("new")
+    assert eventually(lambda: widths(fake, "1") == [960] * 4)
+    # right after that re-layout (before its own events are quiet)
+    fake.add_window()
+    events.put("new")
+    assert eventually(lambda: widths(fake, "1") == [960] * 5)
+    # workspace 2 didn't change, so it's left as it is
+    assert widths(fake, "2") == [960, 960]
@@ -0,0 +1,111 @@
+import json
+import pytest
+from i3_instant_layout import geometry, layouts, main
+
+
+def two_workspaces(fake_i3):
+    fake = fake_i3(3)  # on workspace 1, which has the focus
+    fake.add_workspace("2")
+    for _ in range(4):
+        fake.add_window("2")
+    return fake
+
+
+def widths(fake, name):
+    tree = json.loads(fake.get_tree())
+    todo, workspace = [tree], None
+    while todo:
+        c = todo.pop()
+        if c["type"] == "workspace" and c["name"] == name:
+            workspace = c
+        todo.extend(c["nodes"])
+    todo, result = [workspace], []
+    while todo:
+        c = todo.pop()
+        todo.extend(c["nodes"])
+        if c["window"]:
+            result.append(c["rect"]["width"])
+    return sorted(result)
+
+
+def expected_widths(layout_name, window_count):
+    layout = layouts.registry.get(layout_name)()
+    return sorted(
+        r[2] for r in geometry.window_rectangles(layout, window_count, 1920, 1080)
+    )
+
+
+@pytest.mark.parametrize("backend", [None, "swap", "ipc"])
+@pytest.mark.parametrize(
+    "assignments",
+    [
+        [("1", "mainLeft"), ("2", "mainLeft")],
+        [("2", "vStack"), ("1", "mainCenter")],
+    ],
+)
+def test_batch_with_the_focused_workspace(fake_i3, backend, assignments):
+    fake = two_workspaces(fake_i3)
+    focused = fake.focused()["window"]
+    assert main.apply_to_workspaces(assignments, backend=backend) == []
+    assert fake.workspace()["name"] == "1"
+    assert fake.focused()["window"] == focused
+    counts = {"1": 3, "2": 4}
+    tolerance = 20 if backend == "ipc" else 0
+    for name, layout_name in assignments:
+        assert main.load_workspace_layouts()[name] == layout_name
+        for actual, expected in zip(
+            widths(fake, name), expected_widths(layout_name, counts[name])
+        ):
+            assert abs(actual - expected) <= tolerance
+
+
+def test_hidden_workspace_is_rebuilt_without_showing_it(fake_i3):
+    fake = two_workspaces(fake_i3)
+    fake.add_window("2", floating=True)  # no way around a rebuild then
+    assert main.apply_to_workspaces([("2", "mainLeft")]) == []
+    assert fake.workspace()["name"] == "1"
+    assert widths(fake, "2") == expected_widths("mainLeft", 5)  # floating too
+    assert any("append_layout" in x for x in fake.commands)
+    assert not fake.forks  # swallow can't do hidden windows, swap it is
+
+
+def test_unknown_workspace_and_layout(fake_i3):
+    two_workspaces(fake_i3)
+    assert main.apply_to_workspaces(
+        [("3", "mainLeft"), ("2", "noSuchLayoutAtAll"), ("1", "vStack")]
+    ) == ["3", "2"]
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        (["--workspace", "2", "mainLeft"], [("2", "mainLeft")]),
+        (
+            ["--workspace", "2", "mainLeft", "--swap", "--workspace", "3", "tabbed"],
+            [("2", "mainLeft"), ("3", "tabbed")],
+        ),
+        (["--batch", "1=mainLeft, 2 = matrix"], [("1", "mainLeft"), ("2", "matrix")]),
+    ],
+)
+def test_parse_assignments(args, expected):
+    assert main.parse_assignments(args) == expected
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--workspace", "2"],
+        ["--workspace", "2", "--batch", "1=vStack"],
+        ["--batch"],
+        ["--batch", "1=mainLeft,2"],
+        ["--batch", "=mainLeft"],
+        ["--workspace", "2", "mainLeft", "extra"],
+    ],
+)
+def test_malformed_assignments(fake_i3, capsys, args):
+    fake = fake_i3(3)
+    with pytest.raises(ValueError):
+        main.parse_assignments(args)
+    assert main.workspaces_command(args) == 1
+    assert capsys.readouterr().out.startswith(("Expected", "Unexpected"))
+    assert not fake.commands